@@ -10,23 +10,59 @@
 # de réveil sur les systèmes lents ou chargés.
 # ==============================================================================
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import threading
 import time
 import subprocess
 import os
 import sys
 import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import atexit
+import zlib
 import json
+import functools
+import hashlib
+import queue
+import socket
+import sqlite3
+import string
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+import unicodedata
+from collections import OrderedDict, Counter, defaultdict, deque
+from urllib.parse import urlsplit, parse_qs
 from wakeonlan import send_magic_packet
 
 # --- CONFIGURATION LOGGING ---
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+# Un appel de log ne fait qu'empiler l'enregistrement : formatage et écriture (console, capture)
+# ont lieu dans le thread du QueueListener, hors du chemin de la requête.
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler sans formatage côté appelant (même process : l'enregistrement voyage tel quel).
+    File pleine : l'enregistrement est abandonné plutôt que de bloquer la requête."""
+
+    dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try: self.queue.put_nowait(record)
+        except queue.Full: DeferredQueueHandler.dropped += 1
+
+_console_handler = logging.StreamHandler()
+_console_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
+_console_handler.addFilter(lambda record: record.name != "KodiMiddleware.capture")
+_log_queue = queue.Queue(LOG_QUEUE_SIZE)
+logging.basicConfig(level=logging.INFO, handlers=[DeferredQueueHandler(_log_queue)])
+log_listener = QueueListener(_log_queue, _console_handler, respect_handler_level=True)
+log_listener.start()
+# Vide la file à l'arrêt du process
+atexit.register(log_listener.stop)
 logger = logging.getLogger("KodiMiddleware")
 
 # --- METADATA ---
@@ -46,26 +82,130 @@ if DEBUG_MODE:
     logger.setLevel(logging.DEBUG)
     logger.debug("MODE DEBUG ACTIVÉ : Logs verbeux.")
 
-TRANSLATIONS = {}
+# --- TRADUCTIONS (CATALOGUE COMPILÉ) ---
+TRANSLATIONS_PATH = os.getenv("TRANSLATIONS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'translations.json'))
+# Langue de repli pour une locale Alexa sans traduction (ex. de-DE)
+DEFAULT_LANG = os.getenv("DEFAULT_LANG", "fr")
+# Vérification de la date de modification de translations.json (secondes)
+I18N_RELOAD_INTERVAL = float(os.getenv("I18N_RELOAD_INTERVAL", "2"))
 
-def load_translations():
-    global TRANSLATIONS
-    try:
-        json_path = os.path.join(os.path.dirname(__file__), 'translations.json')
-        with open(json_path, 'r', encoding='utf-8') as f:
-            TRANSLATIONS = json.load(f)
-        logger.info(f"Traductions chargées : {list(TRANSLATIONS.keys())}")
-    except Exception as e:
-        logger.error(f"ERREUR CRITIQUE : Impossible de charger translations.json : {e}")
-        TRANSLATIONS = {"fr": {"not_understood": "Erreur de traduction"}, "en": {"not_understood": "Translation Error"}}
+# Locales Alexa compilées d'avance ; une autre locale partage la table de sa langue de repli
+ALEXA_LOCALES = ["ar-SA", "de-DE", "en-AU", "en-CA", "en-GB", "en-IN", "en-US", "es-ES", "es-MX", "es-US",
+                 "fr-CA", "fr-FR", "hi-IN", "it-IT", "ja-JP", "nl-NL", "pt-BR"]
 
-def get_text(key, lang="fr", *args):
-    target_lang = lang if lang in TRANSLATIONS else "fr"
-    text_template = TRANSLATIONS.get(target_lang, {}).get(key, "")
-    
-    if not text_template and target_lang != "fr":
-        text_template = TRANSLATIONS.get("fr", {}).get(key, "")
-    
+def _placeholders(template):
+    """Nombre de champs {} d'un gabarit ; ValueError si mal formé ou si un champ est nommé."""
+    fields = [field for _, field, _, _ in string.Formatter().parse(template) if field is not None]
+    if any(field and not field.isdigit() for field in fields):
+        raise ValueError("champ nommé")
+    return len(fields)
+
+class MessageCatalog:
+    """translations.json compilé une fois : chaîne de repli par locale résolue d'avance
+    (fr-CA -> fr -> DEFAULT_LANG, en-GB -> en -> DEFAULT_LANG), gabarits vérifiés au chargement
+    (même nombre de {} que la langue par défaut), rechargé à chaud quand le fichier change."""
+
+    def __init__(self, path, default_lang):
+        self.path = path
+        self.default_lang = default_lang
+        self.version = 0
+        self.languages = []
+        self._mtime = None
+        self._checked_at = 0.0
+        self._locales = {}
+        self._warned = set()
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+            with open(self.path, 'r', encoding='utf-8') as f: raw = json.load(f)
+        except Exception as e:
+            logger.error(f"ERREUR CRITIQUE : Impossible de charger {self.path} : {e}")
+            if self.version: return
+            mtime, raw = None, {"fr": {"not_understood": "Erreur de traduction"}, "en": {"not_understood": "Translation Error"}}
+
+        reference = raw.get(self.default_lang, {})
+        expected = {}
+        for key, template in reference.items():
+            try: expected[key] = _placeholders(template)
+            except ValueError as e: logger.error(f"[I18N] Gabarit invalide {self.default_lang}.{key} : {e}")
+
+        tables = {}
+        for lang, messages in raw.items():
+            table = tables[lang] = {}
+            for key, template in messages.items():
+                try: count = _placeholders(template)
+                except ValueError as e:
+                    logger.error(f"[I18N] Gabarit invalide {lang}.{key} : {e}")
+                    continue
+                if key in expected and count != expected[key]:
+                    logger.error(f"[I18N] {lang}.{key} : {count} champ(s) au lieu de {expected[key]}, ignoré (repli).")
+                    continue
+                table[key] = template
+
+        with self._lock:
+            self._tables = tables
+            self.languages = sorted(tables)
+            self._locales = {}
+            self._warned = set()
+            self._mtime = mtime
+            self.version += 1
+        for locale in ALEXA_LOCALES: self.messages(locale)
+        fallback = [l for l in ALEXA_LOCALES if l.split('-')[0] not in tables]
+        logger.info(f"Traductions chargées : {self.languages} (version {self.version}), "
+                    f"repli sur {self.default_lang} pour {len(fallback)} locales Alexa.")
+
+    def chain(self, locale):
+        """fr-CA -> [fr-CA, fr, DEFAULT_LANG] restreint aux langues présentes."""
+        locale = locale or self.default_lang
+        candidates = [locale, locale.split('-')[0], self.default_lang]
+        return [c for i, c in enumerate(candidates) if c in self._tables and c not in candidates[:i]]
+
+    def resolve(self, locale):
+        """Clé de mémoïsation de la locale : elle-même si c'est une locale Alexa ou une langue traduite,
+        sinon la tête de sa chaîne de repli. La locale vient du webhook : les clés restent bornées."""
+        locale = locale or self.default_lang
+        if locale in ALEXA_LOCALES or locale in self._tables: return locale
+        chain = self.chain(locale)
+        head = chain[0] if chain else self.default_lang
+        if locale.split('-')[0] not in self._tables and head not in self._warned:
+            self._warned.add(head)
+            logger.warning(f"[I18N] Locale {locale} non traduite, repli sur {head} (signalé une seule fois).")
+        return head
+
+    def messages(self, locale):
+        """Table clé -> gabarit déjà fusionnée le long de la chaîne de repli de la locale."""
+        self._maybe_reload()
+        locale = self.resolve(locale)
+        table = self._locales.get(locale)
+        if table is not None: return table
+        with self._lock:
+            chain = self.chain(locale)
+            table = {}
+            for lang in reversed(chain): table.update(self._tables[lang])
+            self._locales[locale] = table
+        return table
+
+    def language(self, locale):
+        chain = self.chain(locale)
+        return chain[0].split('-')[0] if chain else self.default_lang
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < I18N_RELOAD_INTERVAL: return
+        self._checked_at = now
+        try: mtime = os.stat(self.path).st_mtime
+        except OSError: return
+        if mtime != self._mtime:
+            logger.info(f"[I18N] {self.path} modifié, rechargement.")
+            self.load()
+
+catalog = MessageCatalog(TRANSLATIONS_PATH, DEFAULT_LANG)
+
+def get_text(key, locale="fr", *args):
+    text_template = catalog.messages(locale).get(key, "")
     if args and text_template:
         try:
             return text_template.format(*args)
@@ -98,36 +238,322 @@ FENLIGHT_LOCAL_TEMP = "/tmp/sources.py"
 BLOCKING_CODE_SNIPPET = "return kodi_utils.notification('WARNING: External Playback Detected!')"
 PATCH_CHECK_INTERVAL = 3600 
 
-# URL de base Kodi
-if SHIELD_IP and KODI_PORT:
-    KODI_BASE_URL = f"http://{SHIELD_IP}:{KODI_PORT}/jsonrpc"
-else:
-    KODI_BASE_URL = None
-    logger.critical("Configuration incomplète : SHIELD_IP ou KODI_PORT manquant.")
+# Pool HTTP keep-alive (un Session par upstream)
+TMDB_API_URL = os.getenv("TMDB_API_URL", "https://api.themoviedb.org/3")
+TRAKT_API_URL = os.getenv("TRAKT_API_URL", "https://api.trakt.tv")
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "1"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.2"))
+TMDB_TIMEOUT = float(os.getenv("TMDB_TIMEOUT", "2"))
+TRAKT_TIMEOUT = float(os.getenv("TRAKT_TIMEOUT", "2"))
+KODI_TIMEOUT = float(os.getenv("KODI_TIMEOUT", "2"))
+# Disjoncteur TMDB/Trakt : échecs consécutifs avant ouverture, délai avant un appel d'essai (secondes)
+BREAKER_THRESHOLD = int(os.getenv("BREAKER_THRESHOLD", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "30"))
+
+# JSON-RPC TCP de Kodi (notifications de lecture), repli HTTP si indisponible
+KODI_TCP_PORT = int(os.getenv("KODI_TCP_PORT", "9090"))
+KODI_TCP_RETRY_DELAY = float(os.getenv("KODI_TCP_RETRY_DELAY", "30"))
+KODI_PLAY_CONFIRM_TIMEOUT = float(os.getenv("KODI_PLAY_CONFIRM_TIMEOUT", "60"))
+
+# Synchro Trakt en tâche de fond (secondes)
+TRAKT_SYNC_INTERVAL = int(os.getenv("TRAKT_SYNC_INTERVAL", "60"))
+TRAKT_FULL_SYNC_INTERVAL = int(os.getenv("TRAKT_FULL_SYNC_INTERVAL", "21600"))
+TRAKT_INDEX_MAX_AGE = int(os.getenv("TRAKT_INDEX_MAX_AGE", "300"))
+
+# Manifestes de saisons : revérification d'une série en cours / terminée (secondes)
+MANIFEST_RECHECK = int(os.getenv("MANIFEST_RECHECK", str(86400)))
+MANIFEST_ENDED_RECHECK = int(os.getenv("MANIFEST_ENDED_RECHECK", str(30 * 86400)))
+# Rafraîchissements simultanés au plus (pool upstream partagé) : le reste attend le prochain accès
+MANIFEST_REFRESH_MAX = int(os.getenv("MANIFEST_REFRESH_MAX", "2"))
+
+# Index de titres local (Kodi + TMDB)
+TITLE_INDEX_REFRESH = int(os.getenv("TITLE_INDEX_REFRESH", "3600"))
+TITLE_INDEX_MIN_SCORE = float(os.getenv("TITLE_INDEX_MIN_SCORE", "0.8"))
+
+# Moniteur de présence Shield/Kodi (secondes)
+PRESENCE_FAST_INTERVAL = float(os.getenv("PRESENCE_FAST_INTERVAL", "0.5"))
+PRESENCE_SLOW_INTERVAL = float(os.getenv("PRESENCE_SLOW_INTERVAL", "30"))
+PRESENCE_BOOST_DURATION = float(os.getenv("PRESENCE_BOOST_DURATION", "60"))
+ADB_PORT = 5555
+
+# Réveil anticipé (LaunchRequest / étape de choix) : intervalle minimal entre deux réveils spéculatifs
+SPECULATIVE_WAKE = os.getenv("SPECULATIVE_WAKE", "true").lower() == "true"
+SPECULATIVE_WAKE_INTERVAL = float(os.getenv("SPECULATIVE_WAKE_INTERVAL", "30"))
+
+# File de lecture (dispatcher Player.Open)
+PLAYBACK_WORKERS = int(os.getenv("PLAYBACK_WORKERS", "2"))
+PLAYBACK_QUEUE_SIZE = int(os.getenv("PLAYBACK_QUEUE_SIZE", "4"))
+
+# Sessions de dialogue gardées côté serveur (secondes / nombre max)
+SESSION_TTL = int(os.getenv("SESSION_TTL", "300"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+
+# Port d'écoute HTTP
+PORT = int(os.getenv("PORT", "5000"))
+
+# Log des requêtes lentes (ms), 0 = désactivé
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+
+# Capture échantillonnée (proportion de sessions Alexa, 0 = désactivée) vers un JSONL tournant, rejouable par bench/replay.py
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "0"))
+CAPTURE_PATH = os.getenv("CAPTURE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "requests.jsonl"))
+CAPTURE_MAX_BYTES = int(os.getenv("CAPTURE_MAX_BYTES", str(20 * 1024 * 1024)))
+CAPTURE_BACKUPS = int(os.getenv("CAPTURE_BACKUPS", "5"))
+
+# Budget de réponse : Alexa coupe à ~8s, on garde une marge pour sérialiser la réponse
+ALEXA_RESPONSE_BUDGET = float(os.getenv("ALEXA_RESPONSE_BUDGET", "6.0"))
+UPSTREAM_WORKERS = int(os.getenv("UPSTREAM_WORKERS", "8"))
+# Attente maximale d'un appel identique déjà en cours (search TMDB, Next Up Trakt)
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "10"))
+
+# Plusieurs Shield : fichier JSON deviceId Alexa -> cible (sinon une seule cible via SHIELD_IP/KODI_PORT)
+DEVICES_CONFIG = os.getenv("DEVICES_CONFIG")
 
 # ==========================================
-# 2. AUTO-PATCHER
+# 2. MÉTRIQUES & TRACES
 # ==========================================
-def check_and_patch_fenlight():
-    if not SHIELD_IP: return
-    if DEBUG_MODE: logger.info(f"[PATCHER] Vérification intégrité Fen Light...")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Stats indexées par instance : la clé devient un label plutôt qu'un morceau du nom de métrique
+GAUGE_INSTANCE_LABELS = {"devices": "device", "http": "client", "single_flight": "group"}
+
+class Metrics:
+    """Compteurs et histogrammes en mémoire, exposés au format texte Prometheus sur /metrics."""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock: self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if not hist: hist = self._histograms[key] = [[0] * len(LATENCY_BUCKETS), 0.0, 0]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound: hist[0][i] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    @staticmethod
+    def _labels(labels, extra=None):
+        items = list(labels) + ([extra] if extra else [])
+        if not items: return ""
+        escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in items) + "}"
+
+    def render(self, gauges=None):
+        lines = []
+        with self._lock:
+            for name in sorted({k[0] for k in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (n, labels), value in sorted(self._counters.items()):
+                    if n == name: lines.append(f"{name}{self._labels(labels)} {value}")
+            for name in sorted({k[0] for k in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (n, labels), (buckets, total, count) in sorted(self._histograms.items()):
+                    if n != name: continue
+                    for bound, bucket in zip(LATENCY_BUCKETS, buckets):
+                        lines.append(f"{name}_bucket{self._labels(labels, ('le', bound))} {bucket}")
+                    lines.append(f"{name}_bucket{self._labels(labels, ('le', '+Inf'))} {count}")
+                    lines.append(f"{name}_sum{self._labels(labels)} {round(total, 6)}")
+                    lines.append(f"{name}_count{self._labels(labels)} {count}")
+        # Jauges : valeurs numériques des stats de chaque sous-système (appareil, client... en label)
+        series = defaultdict(list)
+        for component, values in (gauges or {}).items():
+            label = GAUGE_INSTANCE_LABELS.get(component)
+            for instance, stats in (values.items() if label else [(None, values)]):
+                for key, value in _flatten(stats):
+                    if isinstance(value, bool): value = int(value)
+                    if isinstance(value, (int, float)):
+                        series[f"kodi_middleware_{component}_{key}"].append((((label, instance),) if label else (), value))
+        for name in sorted(series):
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in series[name]: lines.append(f"{name}{self._labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+def _flatten(values, prefix=""):
+    for key, value in values.items():
+        if isinstance(value, dict): yield from _flatten(value, f"{prefix}{key}_")
+        else: yield f"{prefix}{key}", value
+
+metrics = Metrics()
+
+# Trace courante du thread : {"id", "kind", "label", "start", "spans"}
+_trace = threading.local()
+
+def start_trace(request_id, kind):
+    trace = {"id": request_id or "-", "kind": kind, "label": kind, "start": time.monotonic(), "spans": []}
+    _trace.current = trace
+    return trace
+
+def current_trace():
+    return getattr(_trace, "current", None)
+
+def set_trace_label(label):
+    trace = current_trace()
+    if trace: trace["label"] = label
+
+def finish_trace(trace, status="ok"):
+    """Clôt la trace : histogramme de durée totale + log détaillé si elle dépasse SLOW_REQUEST_MS."""
+    _trace.current = None
+    duration = time.monotonic() - trace["start"]
+    metrics.observe("kodi_middleware_request_seconds", duration, kind=trace["kind"], label=trace["label"])
+    metrics.inc("kodi_middleware_requests_total", kind=trace["kind"], label=trace["label"], status=status)
+    if SLOW_REQUEST_MS and duration * 1000 >= SLOW_REQUEST_MS:
+        breakdown = ", ".join(f"{stage}={ms:.0f}ms" for stage, ms in trace["spans"])
+        logger.warning(f"[SLOW] {trace['kind']} {trace['label']} ({trace['id']}) : {duration * 1000:.0f}ms [{breakdown}]")
+    return duration
+
+class span:
+    """Mesure la durée d'une étape, l'ajoute à la trace courante et à l'histogramme par étape."""
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.monotonic() - self.start
+        metrics.observe("kodi_middleware_stage_seconds", duration, stage=self.stage)
+        if exc_type: metrics.inc("kodi_middleware_stage_errors_total", stage=self.stage)
+        trace = current_trace()
+        if trace is not None: trace["spans"].append((self.stage, duration * 1000))
+        return False
+
+def traced(stage):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage): return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def with_trace(trace, fn):
+    """Propage la trace courante vers un autre thread (pool d'exécution)."""
+    def run(*args, **kwargs):
+        _trace.current = trace
+        try: return fn(*args, **kwargs)
+        finally: _trace.current = None
+    return run
+
+# --- CAPTURE (ENREGISTREMENT POUR REPLAY) ---
+capture_logger = logging.getLogger("KodiMiddleware.capture")
+
+class JsonArg:
+    """Argument de log sérialisé en JSON seulement au formatage (thread du QueueListener)."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return json.dumps(self.value, ensure_ascii=False, default=str)
+
+# Jamais écrits dans la capture : jetons d'accès Alexa / liaison de compte, identifiants personnels
+CAPTURE_SECRET_FIELDS = {"apiAccessToken", "accessToken", "consentToken"}
+CAPTURE_ID_FIELDS = {"userId", "personId", "deviceId"}
+
+def redact_envelope(value):
+    """Copie de l'enveloppe Alexa sans jetons ; les identifiants deviennent une empreinte stable
+    (les requêtes d'un même appareil restent reliées entre elles)."""
+    if isinstance(value, list): return [redact_envelope(v) for v in value]
+    if not isinstance(value, dict): return value
+    redacted = {}
+    for key, item in value.items():
+        if key in CAPTURE_SECRET_FIELDS: redacted[key] = "<redacted>"
+        elif key in CAPTURE_ID_FIELDS and isinstance(item, str):
+            redacted[key] = "anon." + hashlib.sha256(item.encode('utf-8')).hexdigest()[:16]
+        else: redacted[key] = redact_envelope(item)
+    return redacted
+
+class JsonLineFormatter(logging.Formatter):
+    """Une capture par ligne JSON ; corps bruts décodés ici, dans le thread d'écriture."""
+
+    @staticmethod
+    def _decode(body):
+        if not isinstance(body, bytes): return body
+        text = body.decode('utf-8', errors='replace')
+        try: return json.loads(text)
+        except ValueError: return text
+
+    def format(self, record):
+        entry = dict(record.msg)
+        entry["request"] = redact_envelope(entry.get("request"))
+        entry["response"] = self._decode(entry.get("response"))
+        entry["upstream"] = [dict(call, body=self._decode(call.get("body"))) for call in entry.get("upstream", [])]
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def _init_capture():
+    if CAPTURE_SAMPLE_RATE <= 0: return None
+    try:
+        os.makedirs(os.path.dirname(CAPTURE_PATH), exist_ok=True)
+        handler = RotatingFileHandler(CAPTURE_PATH, maxBytes=CAPTURE_MAX_BYTES, backupCount=CAPTURE_BACKUPS, encoding='utf-8')
+    except OSError as e:
+        logger.error(f"[CAPTURE] Désactivée ({CAPTURE_PATH}) : {e}")
+        return None
+    handler.setFormatter(JsonLineFormatter())
+    handler.addFilter(lambda record: record.name == capture_logger.name)
+    log_listener.handlers += (handler,)
+    logger.info(f"[CAPTURE] {CAPTURE_SAMPLE_RATE:.0%} des sessions enregistrées dans {CAPTURE_PATH}.")
+    return handler
+
+capture_handler = _init_capture()
+
+def capture_sampled(session_id):
+    """Échantillonnage stable par session : une session capturée l'est en entier, donc rejouable."""
+    if not capture_handler: return False
+    return zlib.crc32(str(session_id).encode('utf-8')) / 2**32 < CAPTURE_SAMPLE_RATE
+
+def capture_upstream(name, method, response, elapsed, payload=None):
+    """Ajoute une réponse upstream à la capture de la requête Alexa en cours (si elle est échantillonnée)."""
+    trace = current_trace()
+    if not trace or trace.get("capture") is None: return
+    url = urlsplit(response.url)
+    # La clé TMDB passe en paramètre d'URL : jamais écrite dans la capture
+    query = {k: v for k, v in parse_qs(url.query).items() if k != "api_key"}
+    trace["capture"].append({"upstream": name, "method": method, "path": url.path, "query": query, "json": payload,
+                             "status": response.status_code, "elapsed_ms": round(elapsed * 1000, 1), "body": response.content})
+
+def record_capture(trace, req_data, result, status, duration):
+    session = req_data.get('session', {})
+    capture_logger.info({
+        "ts": time.time(), "request_id": trace["id"], "session_id": session.get('sessionId'),
+        "label": trace["label"], "status": status, "duration_ms": round(duration * 1000, 1),
+        "request": req_data, "response": result.get_data() if result is not None else None,
+        "upstream": trace["capture"],
+    })
+
+# ==========================================
+# 3. AUTO-PATCHER
+# ==========================================
+def check_and_patch_fenlight(device):
+    if not device.shield_ip: return
+    if DEBUG_MODE: logger.info(f"[PATCHER] Vérification intégrité Fen Light ({device.name})...")
     
     try:
-        subprocess.run(["adb", "disconnect", SHIELD_IP], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        subprocess.run(["adb", "connect", SHIELD_IP], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
+        # On réutilise la session partagée au lieu de la couper (disconnect/connect)
+        device.adb.ensure_connected()
     except Exception as e:
         if DEBUG_MODE: logger.error(f"[PATCHER] Erreur ADB Connect: {e}")
         return
 
-    if os.path.exists(FENLIGHT_LOCAL_TEMP): os.remove(FENLIGHT_LOCAL_TEMP)
+    local_temp = f"{FENLIGHT_LOCAL_TEMP}.{device.name}"
+    if os.path.exists(local_temp): os.remove(local_temp)
     
     try:
-        res = subprocess.run(["adb", "pull", FENLIGHT_REMOTE_PATH, FENLIGHT_LOCAL_TEMP], capture_output=True, timeout=10)
+        res = subprocess.run(["adb", "-s", device.adb.serial, "pull", FENLIGHT_REMOTE_PATH, local_temp], capture_output=True, timeout=10)
         if res.returncode != 0: return 
     except: return
 
     try:
-        with open(FENLIGHT_LOCAL_TEMP, 'r', encoding='utf-8') as f: lines = f.readlines()
+        with open(local_temp, 'r', encoding='utf-8') as f: lines = f.readlines()
         new_lines, patched = [], False
         already_patched = False
         
@@ -144,8 +570,8 @@ def check_and_patch_fenlight():
                 new_lines.append(line)
         
         if patched:
-            with open(FENLIGHT_LOCAL_TEMP, 'w', encoding='utf-8') as f: f.writelines(new_lines)
-            push_res = subprocess.run(["adb", "push", FENLIGHT_LOCAL_TEMP, FENLIGHT_REMOTE_PATH], capture_output=True)
+            with open(local_temp, 'w', encoding='utf-8') as f: f.writelines(new_lines)
+            push_res = subprocess.run(["adb", "-s", device.adb.serial, "push", local_temp, FENLIGHT_REMOTE_PATH], capture_output=True)
             if push_res.returncode == 0:
                 logger.info("[PATCHER] SUCCÈS : Patch appliqué.")
             else:
@@ -158,149 +584,1403 @@ def check_and_patch_fenlight():
 
 def patcher_scheduler():
     while True:
-        check_and_patch_fenlight()
+        for device in devices: check_and_patch_fenlight(device)
         time.sleep(PATCH_CHECK_INTERVAL)
 
 # ==========================================
-# 3. GESTION PUISSANCE
+# 4. CLIENTS HTTP (POOL KEEP-ALIVE)
+# ==========================================
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Appel refusé localement : l'upstream est connu comme défaillant (circuit ouvert)."""
+
+class CircuitBreaker:
+    """Coupe les appels vers un upstream après N échecs consécutifs (exception, 5xx, 429) pour ne plus
+    dépenser le budget de réponse dessus. Après le délai de repos, un seul appel d'essai passe
+    (demi-ouvert) : son succès referme le circuit, son échec le rouvre."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, threshold, reset_after):
+        self.name = name
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.short_circuited = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED: return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_after:
+                self.state = self.HALF_OPEN
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record(self, ok):
+        with self._lock:
+            if ok:
+                if self.state != self.CLOSED: logger.info(f"[BREAKER] {self.name} : circuit refermé.")
+                self.state = self.CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.threshold):
+                logger.warning(f"[BREAKER] {self.name} : circuit ouvert après {self.failures} échecs "
+                               f"(nouvel essai dans {self.reset_after:.0f}s).")
+                self.state = self.OPEN
+                self.opened += 1
+                self._opened_at = time.monotonic()
+
+    def available(self):
+        """Vrai si un appel serait tenté maintenant (sans consommer l'essai demi-ouvert)."""
+        with self._lock:
+            return self.state != self.OPEN or time.monotonic() - self._opened_at >= self.reset_after
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "open": self.state != self.CLOSED, "failures": self.failures,
+                    "opened": self.opened, "short_circuited": self.short_circuited}
+
+class UpstreamClient:
+    """Session requests dédiée à un upstream : connexions réutilisées, en-têtes pré-construits, retry/backoff,
+    disjoncteur optionnel."""
+
+    def __init__(self, name, base_url, timeout, headers=None, params=None, auth=None, retries=0, backoff=0.0,
+                 pool_size=HTTP_POOL_SIZE, breaker=False):
+        self.name = name
+        self.base_url = base_url
+        self.timeout = timeout
+        self.request_count = 0
+        self.error_count = 0
+        self.breaker = CircuitBreaker(name, BREAKER_THRESHOLD, BREAKER_RESET) if breaker else None
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        if headers: self.session.headers.update(headers)
+        if params: self.session.params.update(params)
+        self.session.auth = auth
+
+        # Retry uniquement sur les erreurs de connexion et statuts transitoires (GET seulement)
+        retry = Retry(total=retries, read=0, backoff_factor=backoff,
+                      status_forcelist=[429, 502, 503, 504], allowed_methods=["GET"], raise_on_status=False)
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+    def url(self, path=""):
+        return f"{self.base_url}{path}"
+
+    def get(self, path="", timeout=None, **kwargs):
+        return self._request("GET", path, timeout, **kwargs)
+
+    def post(self, path="", timeout=None, **kwargs):
+        return self._request("POST", path, timeout, **kwargs)
+
+    def _request(self, method, path, timeout, **kwargs):
+        if self.breaker and not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} indisponible (circuit ouvert)")
+        with self._lock: self.request_count += 1
+        started = time.monotonic()
+        try:
+            r = self.session.request(method, self.url(path), timeout=timeout or self.timeout, **kwargs)
+        except Exception:
+            with self._lock: self.error_count += 1
+            if self.breaker: self.breaker.record(False)
+            raise
+        if self.breaker: self.breaker.record(r.status_code < 500 and r.status_code != 429)
+        capture_upstream(self.name, method, r, time.monotonic() - started, kwargs.get("json"))
+        return r
+
+    def stats(self):
+        # Chaque nouvelle connexion TCP/TLS est comptée par urllib3 dans son pool
+        pools = self.adapter.poolmanager.pools
+        connections = sum(pools[k].num_connections for k in list(pools.keys()))
+        reused = max(self.request_count - self.error_count - connections, 0)
+        stats = {
+            "requests": self.request_count, "errors": self.error_count, "connections": connections,
+            "reuse_ratio": round(reused / self.request_count, 3) if self.request_count else 0.0
+        }
+        if self.breaker: stats["breaker"] = self.breaker.stats()
+        return stats
+
+tmdb_client = UpstreamClient("tmdb", TMDB_API_URL, TMDB_TIMEOUT,
+                             params={"api_key": TMDB_API_KEY} if TMDB_API_KEY else None,
+                             retries=HTTP_RETRIES, backoff=HTTP_BACKOFF, breaker=True)
+trakt_client = UpstreamClient("trakt", TRAKT_API_URL, TRAKT_TIMEOUT,
+                              headers={'Content-Type': 'application/json', 'trakt-api-version': '2',
+                                       'trakt-api-key': TRAKT_CLIENT_ID or "", 'Authorization': f'Bearer {TRAKT_ACCESS_TOKEN}'},
+                              retries=HTTP_RETRIES, backoff=HTTP_BACKOFF, breaker=True)
+HTTP_CLIENTS = [tmdb_client, trakt_client]
+
+def get_http_stats():
+    return {c.name: c.stats() for c in HTTP_CLIENTS}
+
+# ==========================================
+# 5. SESSION ADB PERSISTANTE
+# ==========================================
+class AdbSession:
+    """Connexion ADB longue durée : un seul process `adb shell` persistant, alimenté par stdin.
+    Les commandes sont sérialisées entre threads, la reconnexion n'a lieu qu'en cas d'échec."""
+
+    def __init__(self, host, port=ADB_PORT):
+        self.serial = f"{host}:{port}" if host else None
+        self.commands = 0
+        self.connections = 0
+        self.failures = 0
+        self._proc = None
+        self._lines = None
+        self._seq = 0
+        self._latencies = deque(maxlen=200)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._close()
+        subprocess.run(["adb", "connect", self.serial], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
+        self._proc = subprocess.Popen(["adb", "-s", self.serial, "shell"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                      stderr=subprocess.STDOUT, text=True, bufsize=1)
+        self._lines = queue.Queue()
+        threading.Thread(target=self._pump, args=(self._proc, self._lines), daemon=True).start()
+        self.connections += 1
+        logger.info(f"[ADB] Session ouverte vers {self.serial}.")
+
+    @staticmethod
+    def _pump(proc, lines):
+        for line in proc.stdout: lines.put(line)
+        lines.put(None)
+
+    def _close(self):
+        if self._proc:
+            try:
+                self._proc.kill()
+                self._proc.wait(timeout=2)
+            except Exception: pass
+        self._proc = None
+
+    def _alive(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def _exchange(self, script, timeout):
+        # Chaque lot se termine par un marqueur unique qui porte le code retour
+        self._seq += 1
+        marker = f"__ADB_DONE_{self._seq}__"
+        self._proc.stdin.write(f"{script}\necho {marker} $?\n")
+        self._proc.stdin.flush()
+
+        output = []
+        deadline = time.monotonic() + timeout
+        while True:
+            line = self._lines.get(timeout=max(deadline - time.monotonic(), 0.01))
+            if line is None: raise ConnectionError("session adb fermée")
+            if marker in line:
+                head, _, tail = line.partition(marker)
+                output.append(head)
+                return "".join(output), int(tail.split()[0]) if tail.split() else 0
+            output.append(line)
+
+    @traced("adb.batch")
+    def batch(self, commands, timeout=5):
+        """Exécute une liste de commandes shell en un seul aller-retour. Renvoie (sortie, code retour)."""
+        if not self.serial: raise ConnectionError("SHIELD_IP non configuré")
+        script = "\n".join(commands)
+        with self._lock:
+            started = time.monotonic()
+            for attempt in range(2):
+                try:
+                    if not self._alive(): self._connect()
+                    result = self._exchange(script, timeout)
+                    self.commands += len(commands)
+                    self._latencies.append(time.monotonic() - started)
+                    return result
+                except Exception as e:
+                    logger.warning(f"[ADB] Session interrompue ({type(e).__name__}: {e}), reconnexion...")
+                    self._close()
+            self.failures += 1
+            raise ConnectionError(f"ADB injoignable ({self.serial})")
+
+    def shell(self, command, timeout=5):
+        return self.batch([command], timeout)
+
+    def ensure_connected(self):
+        """Garantit une connexion active (pour adb pull/push) sans casser la session existante."""
+        with self._lock:
+            if not self._alive(): self._connect()
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "connected": self._alive(), "commands": self.commands, "connections": self.connections,
+                "failures": self.failures,
+                "latency_avg_ms": round(1000 * sum(latencies) / len(latencies), 1) if latencies else 0.0,
+                "latency_max_ms": round(1000 * latencies[-1], 1) if latencies else 0.0
+            }
+
+# ==========================================
+# 6. CLIENT KODI JSON-RPC (TCP PERSISTANT)
 # ==========================================
-def is_kodi_responsive():
+class KodiRpcClient:
+    """Connexion TCP persistante au port JSON-RPC de Kodi : requêtes pipelinées (réponses associées
+    par id) et abonnement aux notifications (Player.OnPlay, Player.OnAVStart...)."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.confirmed = 0
+        self.unconfirmed = 0
+        self.last_play_latency = None
+        self._sock = None
+        self._next_id = 0
+        self._pending = {}
+        self._listeners = []
+        self._failed_at = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Appelé sous self._lock
+        if self._sock: return True
+        if not self.host or time.time() - self._failed_at < KODI_TCP_RETRY_DELAY: return False
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=2)
+            sock.settimeout(None)
+        except OSError as e:
+            self._failed_at = time.time()
+            logger.debug(f"[KODI-TCP] Connexion impossible ({self.host}:{self.port}) : {e}")
+            return False
+        self._sock = sock
+        threading.Thread(target=self._reader, args=(sock,), name="kodi-tcp", daemon=True).start()
+        logger.info(f"[KODI-TCP] Connecté à {self.host}:{self.port}.")
+        return True
+
+    def _reader(self, sock):
+        decoder = json.JSONDecoder()
+        buffer = ""
+        try:
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk: break
+                buffer += chunk.decode('utf-8', errors='replace')
+                # Kodi envoie des objets JSON concaténés, sans séparateur
+                while True:
+                    buffer = buffer.lstrip()
+                    if not buffer: break
+                    try: message, end = decoder.raw_decode(buffer)
+                    except ValueError: break
+                    buffer = buffer[end:]
+                    self._dispatch(message)
+        except OSError: pass
+        finally:
+            with self._lock:
+                if self._sock is sock: self._sock = None
+                pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done(): future.set_exception(ConnectionError("connexion Kodi fermée"))
+            logger.info("[KODI-TCP] Connexion fermée.")
+
+    def _dispatch(self, message):
+        if "id" in message:
+            with self._lock: future = self._pending.pop(message["id"], None)
+            if future and not future.done(): future.set_result(message)
+            return
+        method = message.get("method")
+        with self._lock: listeners = list(self._listeners)
+        for methods, callback in listeners:
+            if method in methods:
+                try: callback(message)
+                except Exception as e: logger.error(f"[KODI-TCP] Erreur listener : {e}")
+
+    def send(self, method, params=None):
+        """Envoie une requête sans attendre la réponse (pipelining). Renvoie un Future, ou None hors ligne."""
+        future = Future()
+        with self._lock:
+            if not self._connect(): return None
+            self._next_id += 1
+            request_id = self._next_id
+            self._pending[request_id] = future
+            data = json.dumps({"jsonrpc": "2.0", "method": method, "params": params or {}, "id": request_id}).encode('utf-8')
+            try:
+                self._sock.sendall(data)
+            except OSError as e:
+                self._pending.pop(request_id, None)
+                self._sock = None
+                logger.warning(f"[KODI-TCP] Envoi impossible : {e}")
+                return None
+        return future
+
+    def warm(self):
+        """Ouvre la connexion à l'avance (réveil anticipé)."""
+        with self._lock: return self._connect()
+
+    def call(self, method, params=None, timeout=5):
+        future = self.send(method, params)
+        if future is None: raise ConnectionError("Kodi TCP indisponible")
+        return future.result(timeout=timeout)
+
+    def subscribe(self, methods, callback):
+        entry = (frozenset(methods), callback)
+        with self._lock: self._listeners.append(entry)
+        return entry
+
+    def unsubscribe(self, entry):
+        with self._lock:
+            if entry in self._listeners: self._listeners.remove(entry)
+
+    def open_and_confirm(self, plugin_url, requested_at, still_wanted=None):
+        """Player.Open sur la connexion TCP puis attente de Player.OnAVStart/OnPlay.
+        Renvoie None si le TCP est indisponible (l'appelant repasse alors en HTTP)."""
+        # OnPlay = flux ouvert, OnAVStart = première image affichée (c'est elle qui fait foi)
+        events = {"Player.OnPlay": threading.Event(), "Player.OnAVStart": threading.Event()}
+        entry = self.subscribe(events.keys(), lambda message: events[message["method"]].set())
+        try:
+            future = self.send("Player.Open", {"item": {"file": plugin_url}})
+            if future is None: return None
+            try:
+                reply = future.result(timeout=5)
+            except Exception as e:
+                # Requête déjà partie (délai, connexion fermée par Kodi...) : pas de repli HTTP,
+                # on risquerait un double lancement
+                logger.warning(f"[KODI-TCP] Pas de réponse à Player.Open ({e or type(e).__name__}).")
+                with self._lock: self.unconfirmed += 1
+                return False
+            logger.info(f"[KODI-TCP] Réponse RPC : {reply.get('result', reply.get('error'))}")
+            if 'error' in reply: return False
+
+            deadline = time.monotonic() + KODI_PLAY_CONFIRM_TIMEOUT
+            while not events["Player.OnAVStart"].wait(0.5):
+                if time.monotonic() > deadline or (still_wanted and not still_wanted()):
+                    with self._lock: self.unconfirmed += 1
+                    status = "flux ouvert, pas d'image" if events["Player.OnPlay"].is_set() else "aucune notification"
+                    logger.warning(f"[KODI-TCP] Lecture non confirmée ({status}).")
+                    return False
+
+            latency = time.monotonic() - requested_at
+            with self._lock:
+                self.confirmed += 1
+                self.last_play_latency = latency
+            logger.info(f"[KODI-TCP] Lecture confirmée {latency:.1f}s après la demande.")
+            return True
+        finally:
+            self.unsubscribe(entry)
+
+    def stats(self):
+        with self._lock:
+            return {"connected": self._sock is not None, "confirmed": self.confirmed, "unconfirmed": self.unconfirmed,
+                    "last_play_latency_s": round(self.last_play_latency, 2) if self.last_play_latency is not None else None}
+
+# ==========================================
+# 7. GESTION PUISSANCE
+# ==========================================
+def is_kodi_responsive(device):
     """Accepte 200, 401, 405 comme preuve de vie."""
-    if not KODI_BASE_URL: return False
+    if not device.kodi_base_url: return False
     try:
-        r = requests.get(KODI_BASE_URL, timeout=2)
+        r = device.kodi_client.get()
         if r.status_code in [200, 401, 405]: return True
     except: pass
     return False
 
-def wake_and_start_kodi():
-    if not SHIELD_IP or not SHIELD_MAC:
-        logger.error("[POWER] Config manquante.")
+class PresenceMonitor:
+    """Heartbeat en tâche de fond sur l'état de la Shield, avec intervalle adaptatif :
+    rapide juste après une activité ou un changement d'état, lent quand tout est stable."""
+
+    OFF = "off"
+    SCREEN_OFF = "screen_off"
+    KODI_NOT_RUNNING = "kodi_not_running"
+    READY = "ready"
+    UNKNOWN = "unknown"
+
+    def __init__(self, device):
+        self.device = device
+        self.state = self.UNKNOWN
+        self.since = time.time()
+        self.last_probe = 0.0
+        self.probes = 0
+        self._boost_until = 0.0
+        self._started = False
+        self._kick = threading.Event()
+        self._changed = threading.Condition()
+
+    def start(self):
+        with self._changed:
+            if self._started or not self.device.shield_ip: return
+            self._started = True
+        threading.Thread(target=self._run, name=f"presence-{self.device.name}", daemon=True).start()
+
+    def probe(self):
+        if is_kodi_responsive(self.device): return self.READY
+        try:
+            with socket.create_connection((self.device.shield_ip, ADB_PORT), timeout=1): pass
+        except OSError:
+            return self.OFF
+        try:
+            output, _ = self.device.adb.shell("dumpsys power | grep mWakefulness=", timeout=3)
+            if "mWakefulness=Awake" in output: return self.KODI_NOT_RUNNING
+            if "mWakefulness=" in output: return self.SCREEN_OFF
+        except Exception as e:
+            logger.debug(f"[PRESENCE] dumpsys indisponible : {e}")
+        return self.KODI_NOT_RUNNING
+
+    def _set_state(self, state):
+        with self._changed:
+            self.last_probe = time.time()
+            self.probes += 1
+            if state != self.state:
+                logger.info(f"[PRESENCE] {self.device.name} : {self.state} -> {state}")
+                self.state = state
+                self.since = self.last_probe
+                self._boost_until = max(self._boost_until, self.last_probe + PRESENCE_BOOST_DURATION)
+            self._changed.notify_all()
+
+    def _run(self):
+        while True:
+            try: self._set_state(self.probe())
+            except Exception as e: logger.error(f"[PRESENCE] Erreur sonde : {e}")
+            interval = PRESENCE_FAST_INTERVAL if time.time() < self._boost_until else PRESENCE_SLOW_INTERVAL
+            self._kick.wait(interval)
+            self._kick.clear()
+
+    def boost(self):
+        """Passe en sondage rapide (réveil en cours) et déclenche une sonde immédiate."""
+        self.start()
+        with self._changed: self._boost_until = time.time() + PRESENCE_BOOST_DURATION
+        self._kick.set()
+
+    def invalidate(self):
+        """L'état READY connu s'est révélé faux (Kodi injoignable) : on ne s'y fie plus, nouvelle sonde immédiate."""
+        with self._changed: self.last_probe = 0.0
+        self.boost()
+
+    def is_ready(self):
+        with self._changed:
+            return self.state == self.READY and time.time() - self.last_probe < PRESENCE_SLOW_INTERVAL + 5
+
+    def wait_ready(self, timeout, cancel=None):
+        """Bloque jusqu'à l'état READY (notifié par le moniteur, sans tic fixe), l'expiration ou l'annulation."""
+        self.boost()
+        asked_at = time.time()
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            # Seule une sonde postérieure à l'appel fait foi
+            while not (self.state == self.READY and self.last_probe >= asked_at):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (cancel and cancel.is_set()): return False
+                self._changed.wait(min(remaining, 0.5) if cancel else remaining)
+        return True
+
+    def stats(self):
+        with self._changed:
+            return {"state": self.state, "since": round(time.time() - self.since, 1), "probes": self.probes}
+
+@traced("power.wake")
+def wake_and_start_kodi(device, speculative=False):
+    """Un seul réveil à la fois par appareil : les appelants concurrents attendent et partagent son résultat.
+    Des appareils différents se réveillent en parallèle. Un réveil spéculatif est annulable tant
+    qu'aucune vraie demande ne l'a rejoint. Renvoie None si le réveil a été annulé."""
+    if not speculative: device.speculation.claim()
+    with device._wake_lock:
+        wake = device._wake_inflight
+        leader = wake is None
+        if leader:
+            wake = device._wake_inflight = {"done": threading.Event(), "result": False,
+                                            "cancel": threading.Event(), "speculative": speculative}
+        elif not speculative and wake["speculative"]:
+            # Une vraie lecture reprend le réveil anticipé à son compte : il n'est plus annulable
+            wake["speculative"] = False
+            wake["cancel"].clear()
+
+    if not leader:
+        if speculative: return wake["result"]
+        logger.info("[POWER] Réveil déjà en cours, attente du résultat...")
+        wake["done"].wait()
+        # Annulé juste avant d'être rejoint : on relance un réveil normal
+        if wake["result"] is None: return wake_and_start_kodi(device)
+        return wake["result"]
+
+    try:
+        wake["result"] = _wake_and_start_kodi(device, wake["cancel"])
+    finally:
+        with device._wake_lock: device._wake_inflight = None
+        wake["done"].set()
+    return wake["result"]
+
+def _wake_and_start_kodi(device, cancel):
+    presence = device.presence
+    if not device.shield_ip or not device.shield_mac:
+        logger.error(f"[POWER] Config manquante ({device.name}).")
         return False
 
-    if is_kodi_responsive(): 
+    # Kodi connu comme prêt par le moniteur : inutile de sonder à nouveau
+    if presence.is_ready():
+        return True
+    if is_kodi_responsive(device): 
         return True
 
-    logger.info(f"[POWER] Réveil de la Shield ({SHIELD_IP})...")
-    try: send_magic_packet(SHIELD_MAC)
+    if cancel.is_set(): return None
+    started = time.monotonic()
+    presence.boost()
+    logger.info(f"[POWER] Réveil de la Shield {device.name} ({device.shield_ip}, état {presence.state})...")
+    try: send_magic_packet(device.shield_mac)
     except Exception as e: logger.error(f"[POWER] Erreur WoL: {e}")
 
     try:
-        # Increase connection timeout to 5s
-        subprocess.run(["adb", "connect", SHIELD_IP], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
-        # Increase wake command timeout to 5s
-        subprocess.run(["adb", "shell", "input", "keyevent", "WAKEUP"], stdout=subprocess.DEVNULL, timeout=5)
-        time.sleep(0.5)
-        # Increase second wake command timeout to 5s
-        subprocess.run(["adb", "shell", "input", "keyevent", "WAKEUP"], stdout=subprocess.DEVNULL, timeout=5)
+        # Double WAKEUP envoyé en un seul lot sur la session persistante
+        device.adb.batch(["input keyevent WAKEUP", "sleep 0.5", "input keyevent WAKEUP"], timeout=5)
     except Exception as e: logger.error(f"[POWER] Erreur ADB: {e}")
 
-    if is_kodi_responsive(): return True
+    if is_kodi_responsive(device): return True
+    if cancel.is_set(): return None
 
-    logger.info("[POWER] Lancement de Kodi...")
+    logger.info(f"[POWER] Lancement de Kodi ({device.name})...")
     try: 
-        # Increase app launch timeout to 5s
-        subprocess.run(["adb", "shell", "am", "start", "-n", "org.xbmc.kodi/.Splash"], stdout=subprocess.DEVNULL, timeout=5)
-    except: pass
+        device.adb.shell("am start -n org.xbmc.kodi/.Splash", timeout=5)
+    except Exception as e: logger.error(f"[POWER] Erreur ADB: {e}")
 
-    for i in range(45):
-        if is_kodi_responsive(): 
-            logger.info(f"[POWER] Kodi opérationnel après {i+1}s.")
-            time.sleep(4)
-            return True
-        time.sleep(1)
+    if presence.wait_ready(45, cancel):
+        logger.info(f"[POWER] Kodi ({device.name}) opérationnel après {time.monotonic() - started:.1f}s.")
+        if cancel.wait(4): return None
+        return True
+    if cancel.is_set(): return None
     
     logger.error("[POWER] Echec : Kodi ne répond pas.")
     return False
-    
+
+class SpeculativeWake:
+    """Réveil anticipé dès l'ouverture de la skill ou l'étape "reprendre / dernier épisode" : la Shield
+    démarre pendant que l'utilisateur parle. Limité en fréquence, annulable (Non / Stop / fin de session) ;
+    si c'est lui qui a sorti la Shield de veille, l'annulation la rendort, mais seulement si Kodi tourne
+    sans rien lire : sinon quelqu'un a pu la prendre en main à la télécommande entre-temps."""
+
+    def __init__(self, device):
+        self.device = device
+        self.started = 0
+        self.skipped = 0
+        self.cancelled = 0
+        self.slept = 0
+        self.kept_awake = 0
+        self._last_start = 0.0
+        self._woke = False
+        self._lock = threading.Lock()
+
+    def start(self, reason):
+        device = self.device
+        if not SPECULATIVE_WAKE or not device.shield_ip or not device.shield_mac: return False
+        with self._lock:
+            now = time.monotonic()
+            if device.presence.is_ready() or device._wake_inflight or now - self._last_start < SPECULATIVE_WAKE_INTERVAL:
+                self.skipped += 1
+                return False
+            self._last_start = now
+            self._woke = device.presence.state in (PresenceMonitor.OFF, PresenceMonitor.SCREEN_OFF)
+            self.started += 1
+        metrics.inc("kodi_middleware_speculative_wakes_total", reason=reason)
+        logger.info(f"[SPEC] Réveil anticipé de {device.name} ({reason}).")
+        threading.Thread(target=self._run, name=f"spec-{device.name}", daemon=True).start()
+        return True
+
+    def _run(self):
+        # Kodi prêt : on ouvre aussi la connexion TCP pour que Player.Open parte sans attendre
+        if wake_and_start_kodi(self.device, speculative=True): self.device.kodi_rpc.warm()
+
+    def claim(self):
+        """Une vraie lecture est demandée : la Shield doit rester allumée."""
+        with self._lock: self._woke = False
+
+    def cancel(self, reason):
+        device = self.device
+        with device._wake_lock:
+            wake = device._wake_inflight
+            aborting = bool(wake and wake["speculative"])
+            if aborting: wake["cancel"].set()
+        with self._lock:
+            woke, self._woke = self._woke, False
+            if aborting: self.cancelled += 1
+        if aborting: logger.info(f"[SPEC] Réveil anticipé de {device.name} annulé ({reason}).")
+        if woke: threading.Thread(target=self._sleep_if_idle, name=f"spec-sleep-{device.name}", daemon=True).start()
+
+    def _sleep_if_idle(self):
+        device = self.device
+        state = device.presence.probe()
+        if state in (PresenceMonitor.OFF, PresenceMonitor.SCREEN_OFF): return
+        # Kodi pas (encore) lancé : autre appli ou écran d'accueil, on ne sait pas qui s'en sert
+        players = self._active_players() if state == PresenceMonitor.READY else None
+        if players != []:
+            with self._lock: self.kept_awake += 1
+            logger.info(f"[SPEC] {device.name} laissée allumée ({state}, lecteurs actifs : {players}).")
+            return
+        with self._lock: self.slept += 1
+        logger.info(f"[SPEC] Remise en veille de {device.name}.")
+        try: device.adb.shell("input keyevent SLEEP", timeout=5)
+        except Exception as e: logger.error(f"[SPEC] Erreur ADB: {e}")
+
+    def _active_players(self):
+        """Lecteurs Kodi actifs (liste), None si Kodi ne répond pas."""
+        device = self.device
+        try: return device.kodi_rpc.call("Player.GetActivePlayers", timeout=2).get('result')
+        except Exception: pass
+        try:
+            payload = {"jsonrpc": "2.0", "method": "Player.GetActivePlayers", "id": 1}
+            return device.kodi_client.post(json=payload, timeout=2).json().get('result')
+        except Exception: return None
+
+    def stats(self):
+        with self._lock:
+            return {"started": self.started, "skipped": self.skipped, "cancelled": self.cancelled, "slept": self.slept,
+                    "kept_awake": self.kept_awake}
+
+# ==========================================
+# 8. CACHE MÉTADONNÉES (LRU + SQLITE)
+# ==========================================
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cache.db"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2000"))
+# Une entrée expirée reste servable (puis rafraîchie en tâche de fond) pendant cette durée
+CACHE_STALE_MAX = int(os.getenv("CACHE_STALE_MAX", str(30 * 86400)))
+
+# Durées de vie par endpoint (secondes) : les recherches bougent peu, le dernier épisode diffusé si.
+CACHE_TTL = {
+    "search_movie": int(os.getenv("CACHE_TTL_SEARCH", str(7 * 86400))),
+    "search_show": int(os.getenv("CACHE_TTL_SEARCH", str(7 * 86400))),
+    # Conservé longtemps : la fraîcheur est gérée par le manifeste lui-même (dates de diffusion)
+    "manifest": int(os.getenv("CACHE_TTL_MANIFEST", str(30 * 86400))),
+}
+
+def normalize_query(text):
+    """Minuscules, sans accents ni ponctuation, espaces compactés."""
+    text = unicodedata.normalize('NFKD', str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = "".join(c if c.isalnum() else " " for c in text)
+    return " ".join(text.split())
+
+def cache_key(endpoint, query, lang=None, year=None):
+    return f"{endpoint}|{normalize_query(query)}|{lang or ''}|{year or ''}"
+
+class MetadataCache:
+    """Cache à deux niveaux : LRU en mémoire + persistance SQLite (survit aux redémarrages).
+    Les entrées expirées sont gardées stale_max secondes pour être servies pendant leur rafraîchissement."""
+
+    def __init__(self, db_path, max_entries, ttls, stale_max):
+        self.max_entries = max_entries
+        self.ttls = ttls
+        self.stale_max = stale_max
+        self.hits = 0
+        self.disk_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._mem = OrderedDict()
+        self._revalidating = set()
+        self._lock = threading.Lock()
+        self._db = None
+        try:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            # WAL + synchronous=NORMAL : un commit ne force plus de fsync, l'écriture ne bloque pas le service
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, endpoint TEXT, value TEXT, expires_at REAL)")
+            self._db.execute("DELETE FROM cache WHERE expires_at < ?", (time.time() - stale_max,))
+            self._db.commit()
+        except Exception as e:
+            logger.error(f"[CACHE] Persistance désactivée ({db_path}) : {e}")
+            self._db = None
+
+    def lookup(self, key, stale=False):
+        """(valeur, fraîche). Avec stale=True, une entrée expirée depuis moins de stale_max est aussi
+        renvoyée, avec fraîche=False : à l'appelant de la rafraîchir (revalidate)."""
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            from_disk = False
+            if entry:
+                self._mem.move_to_end(key)
+            elif self._db:
+                try:
+                    row = self._db.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+                    if row and row[1] > now - self.stale_max:
+                        entry = (row[1], json.loads(row[0]))
+                        self._store(key, *entry)
+                        from_disk = True
+                except Exception as e:
+                    logger.error(f"[CACHE] Erreur lecture : {e}")
+
+            if entry and entry[0] > now:
+                self.hits += 1
+                if from_disk: self.disk_hits += 1
+                return entry[1], True
+            if entry and stale and entry[0] > now - self.stale_max:
+                self.stale_hits += 1
+                return entry[1], False
+            self.misses += 1
+        return None, False
+
+    def revalidate(self, key, fetch, *args):
+        """Rafraîchit en tâche de fond une entrée périmée qui vient d'être servie (une fois par clé)."""
+        with self._lock:
+            if key in self._revalidating: return
+            self._revalidating.add(key)
+            self.revalidations += 1
+
+        def run():
+            try: fetch(*args)
+            except Exception as e: logger.error(f"[CACHE] Erreur rafraîchissement ({key}) : {e}")
+            finally:
+                with self._lock: self._revalidating.discard(key)
+        upstream_executor.submit(run)
+
+    def set(self, endpoint, key, value):
+        ttl = self.ttls.get(endpoint, 3600)
+        if ttl <= 0: return
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._store(key, expires_at, value)
+            if self._db:
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO cache (key, endpoint, value, expires_at) VALUES (?, ?, ?, ?)",
+                                     (key, endpoint, json.dumps(value), expires_at))
+                    self._db.commit()
+                except Exception as e:
+                    logger.error(f"[CACHE] Erreur écriture : {e}")
+
+    def values(self, endpoint):
+        """Toutes les valeurs persistées d'un endpoint (utilisé pour amorcer l'index de titres)."""
+        with self._lock:
+            if not self._db: return [v for k, (_, v) in self._mem.items() if k.startswith(endpoint + "|")]
+            try:
+                rows = self._db.execute("SELECT value FROM cache WHERE endpoint = ?", (endpoint,)).fetchall()
+                return [json.loads(row[0]) for row in rows]
+            except Exception as e:
+                logger.error(f"[CACHE] Erreur lecture : {e}")
+                return []
+
+    def _store(self, key, expires_at, value):
+        self._mem[key] = (expires_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._mem), "hits": self.hits, "disk_hits": self.disk_hits, "stale_hits": self.stale_hits,
+                "revalidations": self.revalidations, "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0
+            }
+
+metadata_cache = MetadataCache(CACHE_DB_PATH, CACHE_MAX_ENTRIES, CACHE_TTL, CACHE_STALE_MAX)
+
+# ==========================================
+# 9. INDEX DE PROGRESSION TRAKT
+# ==========================================
+def _show_key(tmdb_id):
+    try: return int(tmdb_id)
+    except (TypeError, ValueError): return tmdb_id
+
+class TraktProgressIndex:
+    """Index local TMDB -> Trakt et "Next Up" des séries en cours, tenu à jour en tâche de fond."""
+
+    def __init__(self):
+        self.trakt_ids = {}
+        self.next_up = {}
+        self.last_sync = 0.0
+        self._watched_at = {}
+        self._last_activity = None
+        self._last_full_sync = 0.0
+        self.stale_serves = 0
+        self._kick = threading.Event()
+        self._lock = threading.Lock()
+
+    def is_fresh(self):
+        return time.time() - self.last_sync < TRAKT_INDEX_MAX_AGE
+
+    def lookup(self, tmdb_id, stale=False):
+        """Renvoie (s, e) si l'index est frais (ou stale=True) et connaît la série, sinon None."""
+        with self._lock:
+            if not self.is_fresh() and not stale: return None
+            known = self.next_up.get(_show_key(tmdb_id))
+            if known and not self.is_fresh(): self.stale_serves += 1
+            return known
+
+    def get_trakt_id(self, tmdb_id):
+        with self._lock:
+            return self.trakt_ids.get(_show_key(tmdb_id))
+
+    def remember(self, tmdb_id, trakt_id, next_ep=None):
+        with self._lock:
+            self.trakt_ids[_show_key(tmdb_id)] = trakt_id
+            # Gardé même si l'index est périmé : sert de dernière valeur connue si Trakt tombe
+            if next_ep: self.next_up[_show_key(tmdb_id)] = next_ep
+
+    def kick(self):
+        """Demande une synchro immédiate (skill ouverte : une reprise de série est probable)."""
+        if not self.is_fresh(): self._kick.set()
+
+    def invalidate(self, tmdb_id):
+        """Une lecture est lancée : la progression va bouger, on repasse en live pour cette série."""
+        with self._lock:
+            self.next_up.pop(_show_key(tmdb_id), None)
+            trakt_id = self.trakt_ids.get(_show_key(tmdb_id))
+            self._watched_at.pop(trakt_id, None)
+
+    def sync(self):
+        # 1. Rien n'a changé depuis la dernière synchro ? (un seul appel léger)
+        r = trakt_client.get("/sync/last_activities")
+        r.raise_for_status()
+        marker = r.json().get('episodes', {}).get('watched_at')
+        full = time.time() - self._last_full_sync > TRAKT_FULL_SYNC_INTERVAL
+        if marker and marker == self._last_activity and not full:
+            with self._lock: self.last_sync = time.time()
+            return
+
+        # 2. Liste complète des séries vues ; l'épisode suivant le dernier vu se déduit du manifeste
+        # de saisons, la progression Trakt n'est demandée que si le manifeste manque.
+        # La synchro complète périodique rattrape les nouveaux épisodes diffusés.
+        r = trakt_client.get("/sync/watched/shows")
+        r.raise_for_status()
+        updated = 0
+        for item in r.json():
+            ids = item.get('show', {}).get('ids', {})
+            tmdb_id, trakt_id = ids.get('tmdb'), ids.get('trakt')
+            if not tmdb_id or not trakt_id: continue
+            watched_at = item.get('last_watched_at')
+            with self._lock:
+                self.trakt_ids[tmdb_id] = trakt_id
+                unchanged = not full and self._watched_at.get(trakt_id) == watched_at
+            if unchanged: continue
+
+            watched = [(s['number'], e['number']) for s in item.get('seasons', []) if s.get('number')
+                       for e in s.get('episodes', [])]
+            # Jamais de chargement TMDB ici : des centaines de séries vues partiraient en rafale
+            if watched and manifests.get(tmdb_id, fetch=False):
+                next_ep = manifests.next_after(tmdb_id, *max(watched), fetch=False)
+            else:
+                p = trakt_client.get(f"/shows/{trakt_id}/progress/watched")
+                if p.status_code != 200: continue
+                nxt = p.json().get('next_episode')
+                next_ep = (nxt['season'], nxt['number']) if nxt else None
+            with self._lock:
+                if next_ep: self.next_up[tmdb_id] = tuple(next_ep)
+                else: self.next_up.pop(tmdb_id, None)
+                self._watched_at[trakt_id] = watched_at
+            updated += 1
+
+        with self._lock:
+            self._last_activity = marker
+            self.last_sync = time.time()
+            if full: self._last_full_sync = self.last_sync
+        logger.info(f"[TRAKT] Index synchronisé : {len(self.next_up)} séries en cours ({updated} mises à jour).")
+
+    def stats(self):
+        with self._lock:
+            return {"shows": len(self.trakt_ids), "in_progress": len(self.next_up), "stale_serves": self.stale_serves,
+                    "age": round(time.time() - self.last_sync, 1) if self.last_sync else None}
+
+trakt_index = TraktProgressIndex()
+
+def trakt_sync_scheduler():
+    while True:
+        try: trakt_index.sync()
+        except Exception as e: logger.error(f"[TRAKT] Erreur synchro index : {e}")
+        trakt_index._kick.wait(TRAKT_SYNC_INTERVAL)
+        trakt_index._kick.clear()
+
 # ==========================================
-# 4. HELPERS
+# 10. MANIFESTES DE SAISONS (TMDB)
 # ==========================================
+def _today():
+    return time.strftime("%Y-%m-%d")
+
+class SeasonManifestStore:
+    """Épisodes de chaque série (saison -> [[épisode, date de diffusion]]), chargés une fois depuis TMDB
+    puis rafraîchis saison par saison en tâche de fond. Existence d'un épisode, dernier épisode diffusé
+    et épisode suivant se calculent en mémoire, sans réseau sur le chemin chaud.
+    Un TTL <= 0 (CACHE_TTL_MANIFEST=0) désactive aussi la copie en mémoire : chaque appel recharge depuis TMDB."""
+
+    # TMDB limite append_to_response à 20 sous-requêtes
+    SEASONS_PER_CALL = 20
+
+    def __init__(self, ttl):
+        self.enabled = ttl > 0
+        self._manifests = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.refreshes = 0
+        self.deferred = 0
+
+    def get(self, tmdb_id, fetch=True):
+        """Manifeste en mémoire, sinon persisté, sinon (première demande uniquement) chargé depuis TMDB."""
+        key = _show_key(tmdb_id)
+        with self._lock: manifest = self._manifests.get(key)
+        if manifest is None:
+            # Un manifeste persisté même expiré reste juste ; checked_at déclenche son rafraîchissement
+            manifest = metadata_cache.lookup(cache_key("manifest", key), stale=True)[0]
+            if manifest is None and fetch:
+                try: manifest = self._fetch(key)
+                except Exception as e:
+                    logger.error(f"[MANIFEST] Chargement impossible pour {key} : {e}")
+                    return None
+            if manifest is None: return None
+            if self.enabled:
+                with self._lock: self._manifests[key] = manifest
+        if self._is_stale(manifest): self._schedule_refresh(key, manifest)
+        return manifest
+
+    def _is_stale(self, manifest):
+        # Un épisode annoncé est sorti : la saison en cours a probablement bougé
+        next_air = manifest.get("next_air_date")
+        if next_air and next_air <= _today(): return True
+        recheck = MANIFEST_ENDED_RECHECK if manifest.get("status") in ("Ended", "Canceled") else MANIFEST_RECHECK
+        return time.time() - manifest.get("checked_at", 0) > recheck
+
+    def _schedule_refresh(self, key, manifest):
+        with self._lock:
+            if key in self._refreshing: return
+            if len(self._refreshing) >= MANIFEST_REFRESH_MAX:
+                # Le manifeste périmé reste servi ; il sera rafraîchi à un prochain accès
+                self.deferred += 1
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try: self._fetch(key, manifest)
+            except Exception as e: logger.error(f"[MANIFEST] Rafraîchissement impossible pour {key} : {e}")
+            finally:
+                with self._lock: self._refreshing.discard(key)
+        upstream_executor.submit(refresh)
+
+    @traced("tmdb.manifest")
+    def _fetch(self, key, previous=None):
+        """Document /tv/{id}, puis uniquement les saisons nouvelles, dont le nombre d'épisodes a changé,
+        ou qui contiennent le dernier / prochain épisode annoncé."""
+        r = tmdb_client.get(f"/tv/{key}")
+        r.raise_for_status()
+        show = r.json()
+        counts = {str(s['season_number']): s.get('episode_count', 0) for s in show.get('seasons', [])}
+        seasons = dict(previous["seasons"]) if previous else {}
+        wanted = [n for n, count in counts.items() if n not in seasons or len(seasons[n]) != count]
+        for field in ('last_episode_to_air', 'next_episode_to_air'):
+            n = str((show.get(field) or {}).get('season_number', ''))
+            if n in counts and n not in wanted: wanted.append(n)
+
+        for i in range(0, len(wanted), self.SEASONS_PER_CALL):
+            chunk = wanted[i:i + self.SEASONS_PER_CALL]
+            r = tmdb_client.get(f"/tv/{key}", params={"append_to_response": ",".join(f"season/{n}" for n in chunk)})
+            r.raise_for_status()
+            data = r.json()
+            for n in chunk:
+                episodes = data.get(f"season/{n}", {}).get('episodes', [])
+                seasons[n] = sorted([ep['episode_number'], ep.get('air_date')] for ep in episodes)
+        for n in [n for n in seasons if n not in counts]: del seasons[n]
 
+        manifest = {"seasons": seasons, "status": show.get('status'), "checked_at": time.time(),
+                    "next_air_date": (show.get('next_episode_to_air') or {}).get('air_date')}
+        with self._lock:
+            if self.enabled: self._manifests[key] = manifest
+            if previous: self.refreshes += 1
+            else: self.fetches += 1
+        metadata_cache.set("manifest", cache_key("manifest", key), manifest)
+        logger.info(f"[MANIFEST] Série {key} : {len(seasons)} saisons ({len(wanted)} chargées).")
+        return manifest
+
+    def _episodes(self, manifest, aired_only):
+        """(saison, épisode) dans l'ordre de diffusion, hors épisodes spéciaux (saison 0)."""
+        today = _today()
+        for n in sorted((int(n) for n in manifest["seasons"] if n != "0")):
+            for episode, air_date in manifest["seasons"][str(n)]:
+                if aired_only and (not air_date or air_date > today): continue
+                yield n, episode
+
+    def episode_exists(self, tmdb_id, season, episode):
+        """True/False, ou None si la série n'a pas pu être chargée."""
+        manifest = self.get(tmdb_id)
+        if manifest is None: return None
+        try: season, episode = int(season), int(episode)
+        except (TypeError, ValueError): return False
+        return any(e == episode for e, _ in manifest["seasons"].get(str(season), []))
+
+    def last_aired(self, tmdb_id):
+        manifest = self.get(tmdb_id)
+        if manifest is None: return None, None
+        last = None
+        for last in self._episodes(manifest, aired_only=True): pass
+        return last or (None, None)
+
+    def next_after(self, tmdb_id, season, episode, fetch=True):
+        """Premier épisode déjà diffusé après (saison, épisode) ; None si à jour ou série inconnue."""
+        manifest = self.get(tmdb_id, fetch=fetch)
+        if manifest is None: return None
+        current = (int(season), int(episode))
+        return next((ep for ep in self._episodes(manifest, aired_only=True) if ep > current), None)
+
+    def stats(self):
+        with self._lock:
+            return {"shows": len(self._manifests), "fetches": self.fetches, "refreshes": self.refreshes,
+                    "refreshing": len(self._refreshing), "deferred": self.deferred}
+
+manifests = SeasonManifestStore(CACHE_TTL["manifest"])
+
+# ==========================================
+# 11. INDEX DE TITRES LOCAL (FUZZY)
+# ==========================================
+ROMAN_NUMERALS = {"ii": 2, "iii": 3, "iv": 4, "v": 5, "vi": 6, "vii": 7, "viii": 8, "ix": 9, "x": 10}
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _numbers(text):
+    """Numéros d'un titre normalisé (chiffres et chiffres romains) : "rocky ii" et "rocky 2" -> {2}."""
+    return frozenset(int(t) if t.isdigit() else ROMAN_NUMERALS[t]
+                     for t in text.split() if t.isdigit() or t in ROMAN_NUMERALS)
+
+class TitleIndex:
+    """Index trigrammes des titres connus (bibliothèque Kodi + résultats TMDB déjà résolus).
+    Permet de résoudre un titre sans appel réseau, tolérant aux transcriptions approximatives d'Alexa.
+    Les numéros doivent correspondre exactement : "toy story 3" ne tombe jamais sur "Toy Story 2".
+    Un titre exact partagé par plusieurs œuvres (remakes : "Dune" 1984 / 2021) est signalé ambigu."""
+
+    def __init__(self):
+        self.last_refresh = 0.0
+        self.lookups = 0
+        self.matches = 0
+        self._aliases = {"movie": [], "show": []}
+        self._postings = {"movie": defaultdict(set), "show": defaultdict(set)}
+        self._known = {"movie": set(), "show": set()}
+        self._lock = threading.Lock()
+
+    def add(self, kind, tmdb_id, title, year=None):
+        norm = normalize_query(title)
+        if not tmdb_id or not norm: return
+        tmdb_id = _show_key(tmdb_id)
+        with self._lock:
+            if (tmdb_id, norm) in self._known[kind]: return
+            self._known[kind].add((tmdb_id, norm))
+            aliases = self._aliases[kind]
+            grams = _trigrams(norm)
+            aliases.append((tmdb_id, title, str(year or ""), norm, len(grams), _numbers(norm)))
+            for g in grams: self._postings[kind][g].add(len(aliases) - 1)
+
+    def search(self, kind, query, year=None):
+        """Renvoie (tmdb_id, titre, année, score, unique) du meilleur alias au-dessus du seuil, sinon None.
+        unique : aucun autre tmdb_id ne porte exactement ce titre (après filtre sur l'année)."""
+        norm = normalize_query(query)
+        if not norm: return None
+        grams = _trigrams(norm)
+        numbers = _numbers(norm)
+        with self._lock:
+            self.lookups += 1
+            shared = Counter()
+            postings = self._postings[kind]
+            for g in grams:
+                for idx in postings.get(g, ()): shared[idx] += 1
+
+            best = None
+            exact_ids = set()
+            for idx, count in shared.most_common(25):
+                tmdb_id, title, alias_year, alias_norm, size, alias_numbers = self._aliases[kind][idx]
+                if year and alias_year and str(year) != alias_year: continue
+                # Suite, épisode numéroté : un numéro différent (ou absent d'un côté) n'est pas le même titre
+                if numbers != alias_numbers: continue
+                # Coefficient de Dice sur les trigrammes, 1.0 pour une correspondance exacte
+                score = 1.0 if alias_norm == norm else 2.0 * count / (len(grams) + size)
+                if score >= 1.0: exact_ids.add(tmdb_id)
+                if not best or score > best[3]: best = (tmdb_id, title, alias_year, score)
+
+            if best and best[3] >= TITLE_INDEX_MIN_SCORE:
+                self.matches += 1
+                return best + (len(exact_ids) <= 1,)
+        return None
+
+    def refresh(self):
+        """Reconstruit l'index depuis la bibliothèque Kodi et le cache TMDB, puis l'échange d'un bloc."""
+        fresh = TitleIndex()
+        for tmdb_id, title, year in metadata_cache.values("search_movie"): fresh.add("movie", tmdb_id, title, year)
+        for tmdb_id, name in metadata_cache.values("search_show"): fresh.add("show", tmdb_id, name)
+
+        library = 0
+        online = [device for device in devices if is_kodi_responsive(device)]
+        for device in online:
+            for kind, method, field in [("movie", "VideoLibrary.GetMovies", "movies"), ("show", "VideoLibrary.GetTVShows", "tvshows")]:
+                payload = {"jsonrpc": "2.0", "method": method, "params": {"properties": ["title", "year", "uniqueid"]}, "id": 1}
+                try:
+                    r = device.kodi_client.post(json=payload, timeout=10)
+                    for item in r.json().get('result', {}).get(field, []):
+                        tmdb_id = item.get('uniqueid', {}).get('tmdb')
+                        fresh.add(kind, tmdb_id, item.get('title'), item.get('year') if kind == "movie" else None)
+                        library += 1
+                except Exception as e:
+                    logger.error(f"[INDEX] Erreur lecture bibliothèque Kodi {device.name} ({method}) : {e}")
+        if len(online) < len(devices.devices):
+            # Kodi en veille : on garde les entrées de bibliothèque déjà connues
+            with self._lock:
+                for kind in ["movie", "show"]:
+                    for tmdb_id, title, year, *_ in self._aliases[kind]: fresh.add(kind, tmdb_id, title, year)
+
+        with self._lock:
+            self._aliases, self._postings, self._known = fresh._aliases, fresh._postings, fresh._known
+            self.last_refresh = time.time()
+        logger.info(f"[INDEX] Titres indexés : {len(self._aliases['movie'])} films, {len(self._aliases['show'])} séries ({library} depuis Kodi).")
+
+    def stats(self):
+        with self._lock:
+            return {"movies": len(self._aliases["movie"]), "shows": len(self._aliases["show"]),
+                    "lookups": self.lookups, "matches": self.matches}
+
+title_index = TitleIndex()
+
+def title_index_scheduler():
+    while True:
+        try: title_index.refresh()
+        except Exception as e: logger.error(f"[INDEX] Erreur reconstruction : {e}")
+        time.sleep(TITLE_INDEX_REFRESH)
+
+# ==========================================
+# 12. HELPERS
+# ==========================================
+
+# --- SINGLE-FLIGHT ---
+class SingleFlight:
+    """Regroupe les appels concurrents de même clé (deux Echo, ou un renvoi d'Alexa après une réponse lente) :
+    un seul part en amont, les autres attendent son résultat ou son exception. Au-delà du délai, un appel
+    bloqué n'est plus rejoint et ses suiveurs repartent avec la valeur par défaut. Basé sur Future,
+    donc valable en threads comme sous gevent (threading patché)."""
+
+    def __init__(self, name, timeout):
+        self.name = name
+        self.timeout = timeout
+        self.calls = 0
+        self.shared = 0
+        self.timeouts = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, args, kwargs, default):
+        now = time.monotonic()
+        with self._lock:
+            self.calls += 1
+            entry = self._inflight.get(key)
+            leader = entry is None or now - entry[1] > self.timeout
+            if leader:
+                entry = self._inflight[key] = (Future(), now)
+            else:
+                self.shared += 1
+        future = entry[0]
+
+        if not leader:
+            try:
+                return future.result(timeout=max(entry[1] + self.timeout - now, 0))
+            except FutureTimeout:
+                with self._lock: self.timeouts += 1
+                logger.warning(f"[SINGLEFLIGHT] {self.name} : délai dépassé en attendant l'appel en cours ({key}).")
+                return default
+
+        try:
+            result = fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is entry: del self._inflight[key]
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "shared": self.shared, "timeouts": self.timeouts, "inflight": len(self._inflight)}
+
+SINGLE_FLIGHTS = []
+
+def single_flight(name, key, default):
+    """Décorateur : key(*args, **kwargs) calcule la clé de regroupement à partir des arguments de l'appel."""
+    group = SingleFlight(name, SINGLE_FLIGHT_TIMEOUT)
+    SINGLE_FLIGHTS.append(group)
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return group.do(key(*args, **kwargs), fn, args, kwargs, default)
+        wrapper.single_flight = group
+        return wrapper
+    return decorator
+
+def get_single_flight_stats():
+    return {group.name: group.stats() for group in SINGLE_FLIGHTS}
+
+def tmdb_available():
+    return bool(TMDB_API_KEY) and tmdb_client.breaker.available()
+
+@traced("tmdb.search_movie")
+@single_flight("search_movie", lambda query, year=None, lang="fr": cache_key("search_movie", query, lang, year), (None, None, None))
 def search_tmdb_movie(query, year=None, lang="fr"):
-    if not TMDB_API_KEY: return None, None, None
+    key = cache_key("search_movie", query, lang, year)
+    # Résultat périmé : servi tout de suite, rafraîchi en tâche de fond (TMDB lent ou en panne sans effet)
+    cached, fresh = metadata_cache.lookup(key, stale=True)
+    if cached:
+        if not fresh and TMDB_API_KEY: metadata_cache.revalidate(key, _tmdb_search_movie, query, year, lang, key)
+        logger.debug(f"[CACHE] Film : {query} -> {cached[1]}")
+        return tuple(cached)
+
+    # Alias exact et sans homonyme : réponse locale. Sinon (approchant, remake) : seulement si TMDB ne peut pas répondre
+    local = title_index.search("movie", query, year)
+    if local and ((local[3] >= 1.0 and local[4]) or not tmdb_available()):
+        logger.info(f"[INDEX] Trouvé : {local[1]} ({local[0]}) score={local[3]:.2f}")
+        return local[0], local[1], local[2]
+
+    found = _tmdb_search_movie(query, year, lang, key) if TMDB_API_KEY else None
+    if not found and local and not tmdb_available():
+        logger.info(f"[INDEX] TMDB indisponible, repli : {local[1]} ({local[0]}) score={local[3]:.2f}")
+        found = local[:3]
+    return found or (None, None, None)
+
+def _tmdb_search_movie(query, year, lang, key):
     tmdb_lang = "fr-FR" if lang == "fr" else "en-US"
     
-    base_url = "https://api.themoviedb.org/3/search/movie"
-    params = {"api_key": TMDB_API_KEY, "query": query, "language": tmdb_lang}
+    params = {"query": query, "language": tmdb_lang}
     if year: params['year'] = year
     try:
         logger.debug(f"[TMDB] Recherche Film ({lang}): {query}")
-        r = requests.get(base_url, params=params, timeout=2)
+        r = tmdb_client.get("/search/movie", params=params)
         data = r.json()
         if data.get('results'):
             res = data['results'][0]
             logger.info(f"[TMDB] Trouvé : {res['title']} ({res['id']})")
-            return res['id'], res['title'], res.get('release_date', '')[:4]
+            found = [res['id'], res['title'], res.get('release_date', '')[:4]]
+            metadata_cache.set("search_movie", key, found)
+            # Pas d'alias pour la requête brute : la correspondance requête (+ année) -> id reste dans le cache
+            title_index.add("movie", res['id'], res['title'], found[2])
+            return tuple(found)
         else:
             logger.warning(f"[TMDB] Aucun film trouvé pour : {query}")
     except Exception as e:
         logger.error(f"[TMDB] Erreur : {e}")
-    return None, None, None
+    return None
 
+@traced("tmdb.search_show")
+@single_flight("search_show", lambda query, lang="fr": cache_key("search_show", query, lang), (None, None))
 def search_tmdb_show(query, lang="fr"):
-    if not TMDB_API_KEY: return None, None
+    key = cache_key("search_show", query, lang)
+    cached, fresh = metadata_cache.lookup(key, stale=True)
+    if cached:
+        if not fresh and TMDB_API_KEY: metadata_cache.revalidate(key, _tmdb_search_show, query, lang, key)
+        logger.debug(f"[CACHE] Série : {query} -> {cached[1]}")
+        return tuple(cached)
+
+    local = title_index.search("show", query)
+    if local and ((local[3] >= 1.0 and local[4]) or not tmdb_available()):
+        logger.info(f"[INDEX] Trouvé : {local[1]} ({local[0]}) score={local[3]:.2f}")
+        return local[0], local[1]
+
+    found = _tmdb_search_show(query, lang, key) if TMDB_API_KEY else None
+    if not found and local and not tmdb_available():
+        logger.info(f"[INDEX] TMDB indisponible, repli : {local[1]} ({local[0]}) score={local[3]:.2f}")
+        found = local[:2]
+    return found or (None, None)
+
+def _tmdb_search_show(query, lang, key):
     tmdb_lang = "fr-FR" if lang == "fr" else "en-US"
     
-    base_url = "https://api.themoviedb.org/3/search/tv"
-    params = {"api_key": TMDB_API_KEY, "query": query, "language": tmdb_lang}
+    params = {"query": query, "language": tmdb_lang}
     try:
         logger.debug(f"[TMDB] Recherche Série ({lang}): {query}")
-        r = requests.get(base_url, params=params, timeout=2)
+        r = tmdb_client.get("/search/tv", params=params)
         data = r.json()
         if data.get('results'):
             res = data['results'][0]
             logger.info(f"[TMDB] Trouvé : {res['name']} ({res['id']})")
+            metadata_cache.set("search_show", key, [res['id'], res['name']])
+            title_index.add("show", res['id'], res['name'])
             return res['id'], res['name']
         else:
             logger.warning(f"[TMDB] Aucune série trouvée pour : {query}")
     except Exception as e:
         logger.error(f"[TMDB] Erreur : {e}")
-    return None, None
+    return None
 
+@traced("tmdb.episode")
 def check_episode_exists(tmdb_id, season, episode):
     if not TMDB_API_KEY: return False
-    url = f"https://api.themoviedb.org/3/tv/{tmdb_id}/season/{season}/episode/{episode}"
-    try:
-        r = requests.get(url, params={"api_key": TMDB_API_KEY}, timeout=2)
-        return r.status_code == 200
-    except: return True
+    exists = manifests.episode_exists(tmdb_id, season, episode)
+    if exists is None:
+        # TMDB injoignable : TMDB Helper ne pourrait pas lancer l'épisode non plus
+        logger.warning(f"[MANIFEST] Série {tmdb_id} indisponible, S{season} E{episode} non vérifiable.")
+        return False
+    return exists
 
+@traced("tmdb.last_aired")
 def get_tmdb_last_aired(tmdb_id):
     if not TMDB_API_KEY: return None, None
-    url = f"https://api.themoviedb.org/3/tv/{tmdb_id}"
-    try:
-        r = requests.get(url, params={"api_key": TMDB_API_KEY}, timeout=2)
-        data = r.json()
-        last_ep = data.get('last_episode_to_air')
-        if last_ep: return last_ep['season_number'], last_ep['episode_number']
-    except: pass
-    return None, None
+    return manifests.last_aired(tmdb_id)
 
+@traced("trakt.next_episode")
+@single_flight("trakt_next_episode", lambda tmdb_show_id: _show_key(tmdb_show_id), (None, None))
 def get_trakt_next_episode(tmdb_show_id):
     if not TRAKT_CLIENT_ID or not TRAKT_ACCESS_TOKEN:
         logger.warning("[TRAKT] Token manquant.")
         return None, None
-    
-    headers = {'Content-Type': 'application/json', 'trakt-api-version': '2', 'trakt-api-key': TRAKT_CLIENT_ID, 'Authorization': f'Bearer {TRAKT_ACCESS_TOKEN}'}
+
+    indexed = trakt_index.lookup(tmdb_show_id)
+    if indexed:
+        logger.info(f"[TRAKT] Next Up (index) : S{indexed[0]} E{indexed[1]}")
+        return indexed
+
+    # Repli live : index périmé ou série absente
     try:
-        r = requests.get(f"https://api.trakt.tv/search/tmdb/{tmdb_show_id}?type=show", headers=headers, timeout=2)
-        results = r.json()
-        if not results: return None, None
-        trakt_id = results[0]['show']['ids']['trakt']
+        trakt_id = trakt_index.get_trakt_id(tmdb_show_id)
+        if not trakt_id:
+            r = trakt_client.get(f"/search/tmdb/{tmdb_show_id}", params={"type": "show"})
+            results = r.json()
+            if not results: return None, None
+            trakt_id = results[0]['show']['ids']['trakt']
         
-        r = requests.get(f"https://api.trakt.tv/shows/{trakt_id}/progress/watched", headers=headers, timeout=2)
+        r = trakt_client.get(f"/shows/{trakt_id}/progress/watched")
         next_ep = r.json().get('next_episode')
         
         if next_ep:
             logger.info(f"[TRAKT] Next Up : S{next_ep['season']} E{next_ep['number']}")
+            trakt_index.remember(tmdb_show_id, trakt_id, (next_ep['season'], next_ep['number']))
             return next_ep['season'], next_ep['number']
         else:
+            trakt_index.remember(tmdb_show_id, trakt_id)
             logger.info("[TRAKT] Pas de progression.")
     except Exception as e:
         logger.error(f"[TRAKT] Erreur : {e}")
+        # Trakt lent ou en panne : la dernière progression connue vaut mieux que "pas de progression"
+        known = trakt_index.lookup(tmdb_show_id, stale=True)
+        if known:
+            logger.warning(f"[TRAKT] Next Up périmé servi : S{known[0]} E{known[1]}")
+            return known
     return None, None
 
+# --- FAN-OUT PARALLÈLE ---
+upstream_executor = ThreadPoolExecutor(max_workers=UPSTREAM_WORKERS, thread_name_prefix="upstream")
+
+def submit_fan_out(calls):
+    """Lance des appels indépendants en parallèle sans attendre.
+    calls : liste de (nom, fonction, args, valeur_par_défaut). Renvoie {nom: (future, valeur_par_défaut)}."""
+    trace = current_trace()
+    return {name: (upstream_executor.submit(with_trace(trace, fn), *args), default) for name, fn, args, default in calls}
+
+def collect_fan_out(futures, deadline):
+    """Attend les futures jusqu'à une deadline commune. Un appel en retard ou en erreur renvoie sa valeur
+    par défaut au lieu de faire expirer la skill ; il continue en tâche de fond."""
+    results = {}
+    for name, (future, default) in futures.items():
+        try:
+            results[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeout:
+            logger.warning(f"[FANOUT] {name} hors délai, réponse dégradée.")
+            results[name] = default
+        except Exception as e:
+            logger.error(f"[FANOUT] {name} en erreur : {e}")
+            results[name] = default
+    return results
+
 # --- URL BUILDER ---
 def get_playback_url(tmdb_id, media_type, season=None, episode=None, force_select=False):
     p_def = PLAYER_DEFAULT if PLAYER_DEFAULT else "fenlight_auto.json"
@@ -312,27 +1992,315 @@ def get_playback_url(tmdb_id, media_type, season=None, episode=None, force_selec
     elif media_type == "episode": return f"{url}&tmdb_id={tmdb_id}&season={season}&episode={episode}&type=episode"
     return None
 
-def worker_process(plugin_url):
-    logger.info(">>> DÉBUT PROCESSUS LECTURE")
-    if not wake_and_start_kodi(): 
-        logger.error(">>> ABANDON : Kodi injoignable.")
-        return
-    
+def worker_process(device, plugin_url, still_wanted=None, requested_at=None):
+    requested_at = requested_at or time.monotonic()
+    logger.info(f">>> DÉBUT PROCESSUS LECTURE ({device.name})")
+    for attempt in (1, 2):
+        if not wake_and_start_kodi(device): 
+            logger.error(">>> ABANDON : Kodi injoignable.")
+            set_trace_label("kodi_unreachable")
+            return
+
+        # Une demande plus récente est arrivée pendant le réveil : elle seule sera lancée
+        if still_wanted and not still_wanted():
+            logger.info(">>> ABANDON : demande remplacée par une plus récente.")
+            set_trace_label("superseded")
+            return
+
+        if player_open(device, plugin_url, still_wanted, requested_at) or attempt == 2: break
+        # Kodi répond finalement : la requête a pu passer, pas de second Player.Open
+        if is_kodi_responsive(device): break
+        # Présence READY périmée (Shield éteinte depuis la dernière sonde) : vrai réveil puis un seul nouvel essai
+        logger.warning(f"[KODI] {device.name} injoignable malgré l'état connu, nouveau réveil.")
+        device.presence.invalidate()
+    logger.info(">>> FIN PROCESSUS LECTURE")
+
+def player_open(device, plugin_url, still_wanted, requested_at):
+    """Player.Open en TCP (avec confirmation), repli HTTP. Renvoie False si Kodi n'a pas pu être joint."""
     logger.info(f"[KODI] Envoi URL : {plugin_url}")
+    try:
+        with span("kodi.player_open_tcp"):
+            confirmed = device.kodi_rpc.open_and_confirm(plugin_url, requested_at, still_wanted)
+        if confirmed is not None:
+            if confirmed: metrics.observe("kodi_middleware_time_to_play_seconds", time.monotonic() - requested_at)
+            set_trace_label("tcp_confirmed" if confirmed else "tcp_unconfirmed")
+            return True
+    except Exception as e:
+        logger.warning(f"[KODI-TCP] Echec ({e}), repli HTTP.")
+
+    set_trace_label("http")
     payload = {"jsonrpc": "2.0", "method": "Player.Open", "params": {"item": {"file": plugin_url}}, "id": 1}
     try:
-        auth = (KODI_USER, KODI_PASS) if KODI_USER and KODI_PASS else None
-        r = requests.post(KODI_BASE_URL, json=payload, auth=auth, timeout=5)
+        with span("kodi.player_open_http"):
+            r = device.kodi_client.post(json=payload, timeout=5)
         if r.status_code == 200:
             logger.info(f"[KODI] Réponse RPC : {r.json().get('result', 'OK')}")
         else:
             logger.error(f"[KODI] Erreur HTTP : {r.status_code}")
+        return True
     except Exception as e:
         logger.error(f"[KODI] Exception : {e}")
-    logger.info(">>> FIN PROCESSUS LECTURE")
+        return False
+
+# ==========================================
+# 13. FILE DE LECTURE (DISPATCHER)
+# ==========================================
+class PlaybackDispatcher:
+    """File bornée + pool fixe de workers pour Player.Open.
+    Les demandes en double sont fusionnées et seule la plus récente est lancée."""
+
+    def __init__(self, device, workers, maxsize):
+        self.device = device
+        self.workers = workers
+        self.submitted = 0
+        self.coalesced = 0
+        self.superseded = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize)
+        self._latest_seq = 0
+        self._pending = {}
+        self._wait_times = deque(maxlen=200)
+        self._started = False
+        self._lock = threading.Lock()
+
+    def submit(self, plugin_url):
+        self.device.speculation.claim()
+        with self._lock:
+            self._start()
+            self.submitted += 1
+            self._latest_seq += 1
+            job = self._pending.get(plugin_url)
+            if job:
+                # Même demande déjà en file ou en cours : on la marque comme la plus récente
+                job["seq"] = self._latest_seq
+                self.coalesced += 1
+                logger.info("[QUEUE] Demande identique déjà en cours, fusionnée.")
+                return
+
+            trace = current_trace()
+            job = {"url": plugin_url, "seq": self._latest_seq, "queued_at": time.monotonic(),
+                   "request_id": trace["id"] if trace else None}
+            while True:
+                try:
+                    self._queue.put_nowait(job)
+                    break
+                except queue.Full:
+                    # File pleine : la plus ancienne demande est de toute façon obsolète
+                    try:
+                        old = self._queue.get_nowait()
+                        self._pending.pop(old["url"], None)
+                        self.dropped += 1
+                    except queue.Empty: pass
+            self._pending[plugin_url] = job
+
+    def _start(self):
+        if self._started: return
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"playback-{self.device.name}-{i}", daemon=True).start()
+        self._started = True
+
+    def _is_latest(self, job):
+        with self._lock: return job["seq"] == self._latest_seq
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            waited = time.monotonic() - job["queued_at"]
+            with self._lock: self._wait_times.append(waited)
+            metrics.observe("kodi_middleware_playback_queue_wait_seconds", waited)
+            trace = start_trace(job["request_id"], "playback")
+            trace["spans"].append(("queue.wait", waited * 1000))
+            try:
+                if not self._is_latest(job):
+                    with self._lock: self.superseded += 1
+                    logger.info("[QUEUE] Demande remplacée par une plus récente, ignorée.")
+                    continue
+                worker_process(self.device, job["url"], still_wanted=lambda: self._is_latest(job), requested_at=job["queued_at"])
+            except Exception as e:
+                logger.error(f"[QUEUE] Erreur worker : {e}")
+            finally:
+                finish_trace(trace)
+                with self._lock:
+                    if self._pending.get(job["url"]) is job: del self._pending[job["url"]]
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._wait_times)
+            return {
+                "depth": self._queue.qsize(), "workers": self.workers, "submitted": self.submitted,
+                "coalesced": self.coalesced, "superseded": self.superseded, "dropped": self.dropped,
+                "wait_avg_ms": round(1000 * sum(waits) / len(waits), 1) if waits else 0.0,
+                "wait_max_ms": round(1000 * waits[-1], 1) if waits else 0.0
+            }
 
 # ==========================================
-# 5. ROUTE FLASK
+# 14. REGISTRE DES APPAREILS (MULTI-SHIELD)
+# ==========================================
+class Device:
+    """Une cible Shield/Kodi avec ses propres ressources : pool HTTP Kodi, session ADB,
+    client JSON-RPC TCP, moniteur de présence et file de lecture."""
+
+    def __init__(self, name, shield_ip, shield_mac, kodi_port, kodi_user=None, kodi_pass=None,
+                 kodi_tcp_port=KODI_TCP_PORT, alexa_device_ids=()):
+        self.name = name
+        self.shield_ip = shield_ip
+        self.shield_mac = shield_mac
+        self.alexa_device_ids = list(alexa_device_ids)
+        if shield_ip and kodi_port:
+            self.kodi_base_url = f"http://{shield_ip}:{kodi_port}/jsonrpc"
+        else:
+            self.kodi_base_url = None
+            logger.critical(f"[{name}] Configuration incomplète : SHIELD_IP ou KODI_PORT manquant.")
+
+        # Pas de retry côté Kodi : la boucle de réveil sonde déjà, et Player.Open n'est pas idempotent
+        self.kodi_client = UpstreamClient(f"kodi_{name}", self.kodi_base_url, KODI_TIMEOUT,
+                                          auth=(kodi_user, kodi_pass) if kodi_user and kodi_pass else None)
+        self.adb = AdbSession(shield_ip)
+        self.kodi_rpc = KodiRpcClient(shield_ip, kodi_tcp_port)
+        self.presence = PresenceMonitor(self)
+        self.speculation = SpeculativeWake(self)
+        self.dispatcher = PlaybackDispatcher(self, PLAYBACK_WORKERS, PLAYBACK_QUEUE_SIZE)
+        self._wake_lock = threading.Lock()
+        self._wake_inflight = None
+
+    def stats(self):
+        return {"presence": self.presence.stats(), "playback": self.dispatcher.stats(), "adb": self.adb.stats(),
+                "kodi_rpc": self.kodi_rpc.stats(), "http": self.kodi_client.stats(),
+                "speculation": self.speculation.stats()}
+
+class DeviceRegistry:
+    """deviceId Alexa (context.System.device.deviceId) -> Device. Repli sur l'appareil par défaut."""
+
+    def __init__(self):
+        self.devices = {}
+        self.default = None
+        self._by_alexa_id = {}
+
+    def add(self, device, default=False):
+        self.devices[device.name] = device
+        for alexa_id in device.alexa_device_ids: self._by_alexa_id[alexa_id] = device
+        if default or not self.default: self.default = device
+
+    def resolve(self, alexa_device_id):
+        device = self._by_alexa_id.get(alexa_device_id)
+        if not device and alexa_device_id and len(self.devices) > 1:
+            logger.warning(f"[DEVICES] Appareil Alexa inconnu ({alexa_device_id}), cible par défaut : {self.default.name}")
+        return device or self.default
+
+    def __iter__(self):
+        return iter(list(self.devices.values()))
+
+def load_device_registry():
+    """Charge DEVICES_CONFIG (JSON) ; sans fichier, une seule cible construite depuis les variables d'environnement."""
+    registry = DeviceRegistry()
+    if DEVICES_CONFIG:
+        try:
+            with open(DEVICES_CONFIG, 'r', encoding='utf-8') as f: config = json.load(f)
+            for name, cfg in config.get("devices", {}).items():
+                registry.add(Device(name, cfg.get("shield_ip"), cfg.get("shield_mac"), cfg.get("kodi_port"),
+                                    cfg.get("kodi_user"), cfg.get("kodi_pass"), int(cfg.get("kodi_tcp_port", KODI_TCP_PORT)),
+                                    cfg.get("alexa_device_ids", [])),
+                             default=name == config.get("default"))
+            logger.info(f"[DEVICES] {len(registry.devices)} appareils chargés depuis {DEVICES_CONFIG}.")
+        except Exception as e:
+            logger.critical(f"[DEVICES] Impossible de charger {DEVICES_CONFIG} : {e}")
+    if not registry.devices:
+        registry.add(Device("default", SHIELD_IP, SHIELD_MAC, KODI_PORT, KODI_USER, KODI_PASS), default=True)
+    return registry
+
+devices = load_device_registry()
+
+def get_alexa_device_id(req_data):
+    return req_data.get('context', {}).get('System', {}).get('device', {}).get('deviceId')
+
+# ==========================================
+# 15. SESSIONS DE DIALOGUE
+# ==========================================
+class DialogSessionStore:
+    """État des dialogues en cours gardé côté serveur, indexé par sessionId Alexa : série résolue,
+    résultats et recherches encore en vol, URLs de lecture préparées. Alexa ne transporte plus
+    qu'un jeton (sessionAttributes.session_token). Expiration par TTL et taille bornée (LRU)."""
+
+    def __init__(self, ttl, max_sessions):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.created = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, session_id, **fields):
+        state = {"token": os.urandom(8).hex(), "results": {}, "lookups": {}, "urls": {}, **fields}
+        now = time.monotonic()
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._sessions[session_id] = (now + self.ttl, state)
+            self.created += 1
+            # Chaque accès repousse l'expiration en fin de file : les plus anciennes sont en tête
+            while self._sessions:
+                oldest_id, (expires_at, _) = next(iter(self._sessions.items()))
+                if expires_at > now and len(self._sessions) <= self.max_sessions: break
+                del self._sessions[oldest_id]
+                if expires_at <= now: self.expired += 1
+                else: self.evicted += 1
+        return state
+
+    def get(self, session_id, attributes):
+        token = attributes.get("session_token")
+        if not token: return self._from_attributes(session_id, attributes)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry and entry[0] <= now:
+                del self._sessions[session_id]
+                self.expired += 1
+                entry = None
+            if not entry or entry[1]["token"] != token:
+                self.misses += 1
+                return None
+            self._sessions[session_id] = (now + self.ttl, entry[1])
+            self._sessions.move_to_end(session_id)
+            self.hits += 1
+            return entry[1]
+
+    def _from_attributes(self, session_id, attributes):
+        """Dialogue commencé avant le passage au stockage serveur : l'état complet est encore dans les attributs."""
+        if not attributes.get('pending_show_id'): return None
+        state = self.open(session_id, step=attributes.get('step'), show_id=attributes['pending_show_id'],
+                          show_name=attributes.get('pending_show_name'), force_select=attributes.get('force_select', False))
+        state["results"]["trakt_next"] = (attributes.get('trakt_next_s'), attributes.get('trakt_next_e'))
+        state["results"]["tmdb_last"] = (attributes.get('tmdb_last_s'), attributes.get('tmdb_last_e'))
+        return state
+
+    def close(self, session_id):
+        with self._lock: self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"active": len(self._sessions), "created": self.created, "hits": self.hits, "misses": self.misses,
+                    "expired": self.expired, "evicted": self.evicted}
+
+dialog_sessions = DialogSessionStore(SESSION_TTL, SESSION_MAX)
+
+def session_episode(state, name, deadline, force_select=False):
+    """(saison, épisode, url) d'une recherche du dialogue : résultat déjà connu, ou recherche lancée
+    au tour précédent et terminée depuis en tâche de fond. (None, None, None) si rien."""
+    if name not in state["results"] and name in state["lookups"]:
+        future, default = state["lookups"][name]
+        value = collect_fan_out({name: (future, default)}, deadline)[name]
+        if future.done(): state["results"][name] = value
+    s, e = state["results"].get(name) or (None, None)
+    if not s or not e: return None, None, None
+    key = (name, force_select)
+    if key not in state["urls"]:
+        state["urls"][key] = get_playback_url(state["show_id"], "episode", s, e, force_select)
+    return s, e, state["urls"][key]
+
+# ==========================================
+# 16. ROUTE FLASK
 # ==========================================
 
 @app.route('/alexa-webhook', methods=['POST'])
@@ -342,22 +2310,59 @@ def alexa_handler():
         logger.error("Bad Request")
         return jsonify({"error": "Invalid Request"}), 400
 
+    trace = start_trace(req_data['request'].get('requestId'), "alexa")
+    if capture_sampled(req_data.get('session', {}).get('sessionId')): trace["capture"] = []
+    status = "error"
+    result = None
+    try:
+        result = handle_alexa_request(req_data)
+        status = "ok"
+        return result
+    finally:
+        duration = finish_trace(trace, status)
+        if trace.get("capture") is not None: record_capture(trace, req_data, result, status, duration)
+
+# Label des métriques par requête : le corps n'est pas authentifié, seuls les types / intents traités
+# ci-dessous deviennent une série Prometheus, le reste est regroupé sous "other"
+HANDLED_REQUEST_LABELS = frozenset([
+    "LaunchRequest", "SessionEndedRequest", "IntentRequest",
+    "ResumeTVShowIntent", "PlayMovieIntent", "PlayTVShowIntent", "LatestEpisodeIntent",
+    "AMAZON.YesIntent", "ResumeIntent", "ReprendreIntent",
+    "AMAZON.NoIntent", "AMAZON.StopIntent", "AMAZON.CancelIntent",
+])
+
+def request_label(name):
+    return name if name in HANDLED_REQUEST_LABELS else "other"
+
+def handle_alexa_request(req_data):
+    deadline = time.monotonic() + ALEXA_RESPONSE_BUDGET
     req_type = req_data['request']['type']
+    set_trace_label(request_label(req_type))
     session = req_data.get('session', {})
-    attributes = session.get('attributes', {})
+    session_id = session.get('sessionId')
+    dialog = dialog_sessions.get(session_id, session.get('attributes') or {})
+    device = devices.resolve(get_alexa_device_id(req_data))
     
     # --- DÉTECTION LANGUE ---
-    full_locale = req_data['request'].get('locale', 'fr-FR')
-    lang = full_locale.split('-')[0]
+    locale = req_data['request'].get('locale', 'fr-FR')
+    lang = catalog.language(locale)
     
     # LOG SYSTÉMATIQUE DE LA LANGUE (INFO)
-    logger.info(f"Requête reçue ({req_type}) - Langue détectée : {lang.upper()} ({full_locale})")
+    logger.info(f"Requête reçue ({req_type}) - Langue détectée : {lang.upper()} ({locale})")
     
     if DEBUG_MODE:
-        logger.debug(json.dumps(req_data))
+        # Sérialisée par le thread de log, pas par la requête
+        logger.debug("%s", JsonArg(req_data))
 
     if req_type == "LaunchRequest":
-        return jsonify(build_response(get_text("launch", lang), end_session=False))
+        # L'utilisateur va demander un titre : on réveille la Shield et rafraîchit Trakt pendant qu'il parle
+        device.speculation.start("launch")
+        if TRAKT_CLIENT_ID and TRAKT_ACCESS_TOKEN: trakt_index.kick()
+        return static_response("launch", locale)
+
+    if req_type == "SessionEndedRequest":
+        device.speculation.cancel("fin de session")
+        dialog_sessions.close(session_id)
 
     if req_type == "IntentRequest":
         intent = req_data['request']['intent']
@@ -365,47 +2370,49 @@ def alexa_handler():
         slots = intent.get('slots', {})
         
         logger.info(f"Intent: {intent_name}")
+        set_trace_label(request_label(intent_name))
 
         slot_source_mode = slots.get('SourceMode', {}).get('value')
         has_slot_force = True if slot_source_mode else False
-        has_session_force = attributes.get('force_select', False)
+        has_session_force = dialog.get('force_select', False) if dialog else False
         force_select = has_slot_force or has_session_force
         
-        manual_msg = get_text("manual_select", lang) if force_select else ""
+        manual_msg = get_text("manual_select", locale) if force_select else ""
 
         # --- RESUME SHOW ---
         if intent_name == "ResumeTVShowIntent":
             query = slots.get('ShowName', {}).get('value')
-            if not query: return jsonify(build_response(get_text("ask_show", lang), end_session=False))
+            if not query: return jsonify(build_response(get_text("ask_show", locale), end_session=False))
 
             tmdb_id, title = search_tmdb_show(query, lang=lang)
-            if not tmdb_id: return jsonify(build_response(get_text("show_not_found", lang, query)))
+            if not tmdb_id: return jsonify(build_response(get_text("show_not_found", locale, query)))
 
             s, e = get_trakt_next_episode(tmdb_id)
             if s and e:
                 url = get_playback_url(tmdb_id, "episode", s, e, force_select)
-                threading.Thread(target=worker_process, args=(url,)).start()
-                return jsonify(build_response(get_text("resume_show", lang, title, s, e, manual_msg)))
+                trakt_index.invalidate(tmdb_id)
+                device.dispatcher.submit(url)
+                return jsonify(build_response(get_text("resume_show", locale, title, s, e, manual_msg)))
             else:
-                return jsonify(build_response(get_text("no_progress", lang, title), end_session=False))
+                return jsonify(build_response(get_text("no_progress", locale, title), end_session=False))
 
         # --- PLAY MOVIE ---
         elif intent_name == "PlayMovieIntent":
             query = slots.get('MovieName', {}).get('value')
             year_query = slots.get('MovieYear', {}).get('value')
             
-            if not query: return jsonify(build_response(get_text("ask_movie", lang), end_session=False))
+            if not query: return jsonify(build_response(get_text("ask_movie", locale), end_session=False))
             
             movie_id, movie_title, movie_year = search_tmdb_movie(query, year=year_query, lang=lang)
             
             if movie_id:
                 url = get_playback_url(movie_id, "movie", force_select=force_select)
-                threading.Thread(target=worker_process, args=(url,)).start()
+                device.dispatcher.submit(url)
                 year_str = f" ({movie_year})" if lang == 'en' else f" de {movie_year}"
                 if not movie_year: year_str = ""
-                return jsonify(build_response(get_text("launch_movie", lang, movie_title, year_str, manual_msg)))
+                return jsonify(build_response(get_text("launch_movie", locale, movie_title, year_str, manual_msg)))
             else:
-                return jsonify(build_response(get_text("movie_not_found", lang, query)))
+                return jsonify(build_response(get_text("movie_not_found", locale, query)))
 
         # --- PLAY SHOW ---
         elif intent_name == "PlayTVShowIntent":
@@ -413,70 +2420,96 @@ def alexa_handler():
             season = slots.get('Season', {}).get('value')
             episode = slots.get('Episode', {}).get('value')
 
-            if not query and attributes.get('pending_show_id'):
-                tmdb_id = attributes['pending_show_id']
-                title = attributes['pending_show_name']
+            if not query and dialog and dialog.get('show_id'):
+                tmdb_id = dialog['show_id']
+                title = dialog['show_name']
             elif query:
                 tmdb_id, title = search_tmdb_show(query, lang=lang)
             else:
-                return jsonify(build_response(get_text("ask_which_show", lang), end_session=False))
+                return jsonify(build_response(get_text("ask_which_show", locale), end_session=False))
 
-            if not tmdb_id: return jsonify(build_response(get_text("show_not_found", lang, query)))
+            if not tmdb_id: return jsonify(build_response(get_text("show_not_found", locale, query)))
 
             if season and episode:
                 if check_episode_exists(tmdb_id, season, episode):
                     url = get_playback_url(tmdb_id, "episode", season, episode, force_select)
-                    threading.Thread(target=worker_process, args=(url,)).start()
-                    return jsonify(build_response(get_text("launch_show", lang, title, season, episode, manual_msg)))
+                    trakt_index.invalidate(tmdb_id)
+                    device.dispatcher.submit(url)
+                    return jsonify(build_response(get_text("launch_show", locale, title, season, episode, manual_msg)))
                 else:
-                    return jsonify(build_response(get_text("episode_not_found", lang), end_session=False))
+                    return jsonify(build_response(get_text("episode_not_found", locale), end_session=False))
             else:
-                trakt_s, trakt_e = get_trakt_next_episode(tmdb_id)
-                tmdb_last_s, tmdb_last_e = get_tmdb_last_aired(tmdb_id)
-
-                new_attr = {
-                    "pending_show_id": tmdb_id, "pending_show_name": title,
-                    "step": "ask_playback_method", "force_select": force_select,
-                    "trakt_next_s": trakt_s, "trakt_next_e": trakt_e,
-                    "tmdb_last_s": tmdb_last_s, "tmdb_last_e": tmdb_last_e
-                }
+                # Trakt et TMDB sont indépendants : on les interroge en parallèle. Une recherche
+                # hors délai reste attachée à la session et servira à la réponse suivante.
+                dialog = dialog_sessions.open(session_id, step="ask_playback_method", show_id=tmdb_id,
+                                              show_name=title, force_select=force_select)
+                dialog["lookups"] = submit_fan_out([
+                    ("trakt_next", get_trakt_next_episode, (tmdb_id,), (None, None)),
+                    ("tmdb_last", get_tmdb_last_aired, (tmdb_id,), (None, None)),
+                ])
+                trakt_s, trakt_e, _ = session_episode(dialog, "trakt_next", deadline, force_select)
+                session_episode(dialog, "tmdb_last", deadline, force_select)
 
                 if trakt_s:
-                    msg = get_text("ask_resume", lang, title, trakt_s, trakt_e)
+                    msg = get_text("ask_resume", locale, title, trakt_s, trakt_e)
                 else:
-                    msg = get_text("ask_start", lang, title)
+                    msg = get_text("ask_start", locale, title)
 
-                return jsonify(build_response(msg, end_session=False, attributes=new_attr))
+                # Les deux réponses possibles sont déjà connues : seule la Shield reste à préparer
+                device.speculation.start("ask_playback_method")
+
+                return jsonify(build_response(msg, end_session=False, attributes={"session_token": dialog["token"]}))
 
         # --- REPONSES ---
         elif intent_name in ["AMAZON.YesIntent", "ResumeIntent", "ReprendreIntent"]: 
-            if attributes.get('step') == 'ask_playback_method':
-                if attributes.get('trakt_next_s'):
-                    s, e = attributes['trakt_next_s'], attributes['trakt_next_e']
-                    title = attributes['pending_show_name']
-                    url = get_playback_url(attributes['pending_show_id'], "episode", s, e, force_select)
-                    threading.Thread(target=worker_process, args=(url,)).start()
-                    manual_txt = get_text("manual_select", lang) if force_select else ""
-                    return jsonify(build_response(get_text("resume_show", lang, title, s, e, manual_txt)))
+            if dialog and dialog.get('step') == 'ask_playback_method':
+                s, e, url = session_episode(dialog, "trakt_next", deadline, force_select)
+                if url:
+                    title = dialog['show_name']
+                    trakt_index.invalidate(dialog['show_id'])
+                    device.dispatcher.submit(url)
+                    dialog_sessions.close(session_id)
+                    manual_txt = get_text("manual_select", locale) if force_select else ""
+                    return jsonify(build_response(get_text("resume_show", locale, title, s, e, manual_txt)))
                 else:
-                    return jsonify(build_response(get_text("no_history", lang), end_session=False))
+                    # La session reste ouverte : "le dernier épisode" reste possible
+                    return jsonify(build_response(get_text("no_history", locale), end_session=False,
+                                                  attributes={"session_token": dialog["token"]}))
             else:
-                return jsonify(build_response(get_text("nothing_pending", lang)))
+                return jsonify(build_response(get_text("nothing_pending", locale)))
 
         elif intent_name == "LatestEpisodeIntent":
-            if attributes.get('step') == 'ask_playback_method':
-                if attributes.get('tmdb_last_s'):
-                    s, e = attributes['tmdb_last_s'], attributes['tmdb_last_e']
-                    title = attributes.get('pending_show_name', 'show')
-                    url = get_playback_url(attributes['pending_show_id'], "episode", s, e, force_select)
-                    threading.Thread(target=worker_process, args=(url,)).start()
-                    return jsonify(build_response(get_text("launch_last", lang, title)))
-            return jsonify(build_response(get_text("unavailable", lang)))
+            if dialog and dialog.get('step') == 'ask_playback_method':
+                s, e, url = session_episode(dialog, "tmdb_last", deadline, force_select)
+                if url:
+                    title = dialog.get('show_name') or 'show'
+                    trakt_index.invalidate(dialog['show_id'])
+                    device.dispatcher.submit(url)
+                    dialog_sessions.close(session_id)
+                    return jsonify(build_response(get_text("launch_last", locale, title)))
+            return jsonify(build_response(get_text("unavailable", locale)))
 
         elif intent_name in ["AMAZON.NoIntent", "AMAZON.StopIntent", "AMAZON.CancelIntent"]:
-            return jsonify(build_response(get_text("cancelled", lang)))
+            device.speculation.cancel(intent_name)
+            dialog_sessions.close(session_id)
+            return static_response("cancelled", locale)
+
+    return static_response("not_understood", locale)
+
+@app.route('/stats', methods=['GET'])
+def stats_handler():
+    return jsonify(collect_stats())
 
-    return jsonify(build_response(get_text("not_understood", lang)))
+@app.route('/metrics', methods=['GET'])
+def metrics_handler():
+    return Response(metrics.render(collect_stats()), mimetype="text/plain; version=0.0.4")
+
+def collect_stats():
+    return {"cache": metadata_cache.stats(), "http": get_http_stats(), "trakt_index": trakt_index.stats(),
+            "title_index": title_index.stats(), "manifests": manifests.stats(), "sessions": dialog_sessions.stats(),
+            "single_flight": get_single_flight_stats(), "devices": {d.name: d.stats() for d in devices},
+            "logging": {"queued": _log_queue.qsize(), "dropped": DeferredQueueHandler.dropped,
+                        "capture": capture_handler is not None}}
 
 def build_response(text, end_session=True, attributes={}):
     response = {
@@ -489,6 +2522,19 @@ def build_response(text, end_session=True, attributes={}):
     }
     return response
 
+# Réponses toujours identiques : sérialisées une fois par locale (et par version du catalogue)
+STATIC_RESPONSES = {"launch": False, "cancelled": True, "not_understood": True}
+_static_bodies = {}
+
+def static_response(key, locale):
+    catalog.messages(locale)  # déclenche un éventuel rechargement du catalogue
+    locale = catalog.resolve(locale)
+    cached = _static_bodies.get((key, locale))
+    if not cached or cached[0] != catalog.version:
+        body = app.json.dumps(build_response(get_text(key, locale), end_session=STATIC_RESPONSES[key])).encode('utf-8')
+        cached = _static_bodies[(key, locale)] = (catalog.version, body)
+    return Response(cached[1], mimetype="application/json")
+
 # --- BANNER LOGGING ---
 def print_startup_banner():
     masked_key = f"{TMDB_API_KEY[:4]}...{TMDB_API_KEY[-4:]}" if TMDB_API_KEY else "MISSING"
@@ -501,19 +2547,34 @@ def print_startup_banner():
     print(f" Author  : {APP_AUTHOR}")
     print(f" Debug   : {'ON' if DEBUG_MODE else 'OFF'}")
     print("="*50)
-    print(f" [NET] Shield IP      : {SHIELD_IP if SHIELD_IP else 'MISSING'}")
-    print(f" [NET] Kodi Endpoint  : {KODI_BASE_URL if KODI_BASE_URL else 'INVALID'}")
+    for device in devices:
+        print(f" [NET] Shield {device.name:<9}: {device.shield_ip if device.shield_ip else 'MISSING'} -> "
+              f"{device.kodi_base_url if device.kodi_base_url else 'INVALID'}")
     print(f" [CFG] Player Auto    : {PLAYER_DEFAULT if PLAYER_DEFAULT else 'MISSING'}")
     print(f" [CFG] Player Select  : {PLAYER_SELECT if PLAYER_SELECT else 'MISSING'}")
     print(f" [API] TMDB Key       : {masked_key}")
     print(f" [API] Trakt Token    : {masked_trakt}")
     print(f" [SYS] Auto-Patcher   : ACTIVE (Interval: {PATCH_CHECK_INTERVAL}s)")
+    print(f" [SYS] Trakt Index    : {'ACTIVE (Interval: ' + str(TRAKT_SYNC_INTERVAL) + 's)' if TRAKT_ACCESS_TOKEN else 'OFF'}")
+    print(f" [SYS] Cache          : {CACHE_DB_PATH} (max {CACHE_MAX_ENTRIES} en mémoire)")
     print("="*50 + "\n")
     sys.stdout.flush()
 
-if __name__ == '__main__':
+_initialized = False
+
+def init_app():
+    """Tâches de fond (le catalogue de traductions est compilé dès l'import). Appelé par __main__ ou par gunicorn (post_worker_init)."""
+    global _initialized
+    if _initialized: return
+    _initialized = True
     print_startup_banner()
-    load_translations() 
     patcher_thread = threading.Thread(target=patcher_scheduler, daemon=True)
     patcher_thread.start()
-    app.run(host='0.0.0.0', port=5000)
+    threading.Thread(target=title_index_scheduler, daemon=True).start()
+    for device in devices: device.presence.start()
+    if TRAKT_CLIENT_ID and TRAKT_ACCESS_TOKEN:
+        threading.Thread(target=trakt_sync_scheduler, daemon=True).start()
+
+if __name__ == '__main__':
+    init_app()
+    app.run(host='0.0.0.0', port=PORT)
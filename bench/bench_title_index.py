@@ -0,0 +1,117 @@
+# ==============================================================================
+# FICHIER : bench/bench_title_index.py
+#
+# DESCRIPTION :
+# Benchmark de la résolution de titres : index local (trigrammes) contre
+# l'aller-retour TMDB /search/movie. Mesure la latence (p50/p95) et la
+# qualité (titre attendu en première position) sur des transcriptions
+# approximatives telles qu'Alexa les renvoie, ainsi que les faux positifs :
+# suites et titres voisins absents de l'index, qui ne doivent pas y être résolus.
+#
+# USAGE : python bench/bench_title_index.py [--library 5000] [--rounds 200]
+#         (définir TMDB_API_KEY pour inclure la comparaison live TMDB)
+# ==============================================================================
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("CACHE_DB_PATH", os.path.join(tempfile.mkdtemp(), "cache.db"))
+
+import app  # noqa: E402
+
+# (tmdb_id, titre, année)
+MOVIES = [
+    (27205, "Inception", 2010), (603, "Matrix", 1999), (550, "Fight Club", 1999),
+    (680, "Pulp Fiction", 1994), (157336, "Interstellar", 2014), (155, "The Dark Knight", 2008),
+    (13, "Forrest Gump", 1994), (238, "Le Parrain", 1972), (597, "Titanic", 1997),
+    (19995, "Avatar", 2009), (329, "Jurassic Park", 1993), (496243, "Parasite", 2019),
+    (77338, "Intouchables", 2011), (406, "La Haine", 1995), (98, "Gladiator", 2000),
+    (105, "Retour vers le futur", 1985), (278, "Les Évadés", 1994), (101, "Léon", 1994),
+    (194, "Le Fabuleux Destin d'Amélie Poulain", 2001), (863, "Toy Story 2", 1999),
+    (1367, "Rocky II", 1979), (809, "Shrek 2", 2004), (841, "Dune", 1984), (438631, "Dune", 2021),
+]
+
+# (transcription Alexa, tmdb_id attendu)
+QUERIES = [
+    ("inception", 27205), ("la matrice", 603), ("matrix", 603), ("fight club", 550),
+    ("pulp fiction", 680), ("interstellaire", 157336), ("the dark knight", 155),
+    ("forest gump", 13), ("le parrain", 238), ("titanique", 597), ("avatar", 19995),
+    ("jurassic parc", 329), ("parasite", 496243), ("intouchable", 77338), ("la haine", 406),
+    ("gladiateur", 98), ("retour vers le futur", 105), ("les evades", 278), ("leon", 101),
+    ("le fabuleux destin d amelie poulain", 194), ("toy story 2", 863), ("rocky 2", 1367),
+    # Suites et titres voisins absents de l'index : toute réponse de l'index est un faux positif
+    ("toy story 3", 10193), ("toy story", 862), ("shrek", 808), ("shrek 3", 810), ("rocky", 1366),
+    ("the dark knight rises", 49026),
+    # Remake : titre exact partagé, l'index ne peut pas trancher sans l'année
+    ("dune", 438631),
+]
+
+WORDS = ["nuit", "ombre", "dernier", "royaume", "mission", "secret", "rouge", "voyage", "guerre",
+         "cité", "étoile", "silence", "retour", "empire", "chasseur", "mémoire", "océan", "ville"]
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)] if values else 0.0
+
+def build_index(library_size):
+    rng = random.Random(42)
+    for tmdb_id, title, year in MOVIES: app.title_index.add("movie", tmdb_id, title, year)
+    # Bibliothèque synthétique pour avoir une taille d'index réaliste
+    for i in range(library_size):
+        title = " ".join(rng.sample(WORDS, rng.randint(2, 4)))
+        app.title_index.add("movie", 10_000_000 + i, title, rng.randint(1960, 2025))
+
+def bench_index(rounds):
+    latencies, correct, false_positives = [], 0, 0
+    for _ in range(rounds):
+        for query, expected in QUERIES:
+            t0 = time.perf_counter()
+            found = app.title_index.search("movie", query)
+            latencies.append((time.perf_counter() - t0) * 1000)
+    for query, expected in QUERIES:
+        found = app.title_index.search("movie", query)
+        if found and found[0] == expected: correct += 1
+        elif found:
+            false_positives += 1
+            # Seul un alias exact sans homonyme court-circuite TMDB joignable ; sinon repli en panne seulement
+            served = "toujours servi" if found[3] >= 1.0 and found[4] else "servi seulement si TMDB indisponible"
+            print(f"  faux positif : {query!r} -> {found[1]} (score {found[3]:.2f}, {served})")
+    return latencies, correct, false_positives
+
+def bench_tmdb():
+    latencies, correct, false_positives = [], 0, 0
+    for query, expected in QUERIES:
+        t0 = time.perf_counter()
+        try:
+            r = app.tmdb_client.get("/search/movie", params={"query": query, "language": "fr-FR"})
+            results = r.json().get('results', [])
+        except Exception as e:
+            print(f"  [TMDB] Erreur : {e}")
+            results = []
+        latencies.append((time.perf_counter() - t0) * 1000)
+        if results and results[0]['id'] == expected: correct += 1
+        elif results: false_positives += 1
+    return latencies, correct, false_positives
+
+def report(name, latencies, correct, false_positives):
+    print(f"{name:<8} p50={percentile(latencies, 50):8.3f} ms  p95={percentile(latencies, 95):8.3f} ms  "
+          f"qualité={correct}/{len(QUERIES)}  faux positifs={false_positives}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark index de titres vs TMDB")
+    parser.add_argument("--library", type=int, default=5000, help="nombre de titres synthétiques ajoutés à l'index")
+    parser.add_argument("--rounds", type=int, default=200, help="répétitions de la série de requêtes (index)")
+    args = parser.parse_args()
+
+    build_index(args.library)
+    print(f"Index : {app.title_index.stats()}")
+    report("index", *bench_index(args.rounds))
+    if app.TMDB_API_KEY:
+        report("tmdb", *bench_tmdb())
+    else:
+        print("tmdb     ignoré (TMDB_API_KEY non défini)")
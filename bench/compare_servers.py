@@ -0,0 +1,41 @@
+# ==============================================================================
+# FICHIER : bench/compare_servers.py
+#
+# DESCRIPTION :
+# Compare débit et latences de queue (p95/p99) entre le serveur de dev Flask
+# et le mode production gunicorn (gevent, et gthread en référence), sous la
+# même charge concurrente et les mêmes stubs (voir bench/run_bench.py).
+#
+# USAGE : python bench/compare_servers.py --concurrency 32 --requests 1000 --latency 300 --cold
+# ==============================================================================
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run_bench import add_common_args, bench_server  # noqa: E402
+
+MODES = {
+    "flask-dev": [sys.executable, "app.py"],
+    "gunicorn-gevent": [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+    "gunicorn-gthread": [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-k", "gthread", "app:app"],
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Comparaison serveur de dev / gunicorn")
+    add_common_args(parser)
+    parser.add_argument("--modes", nargs="*", default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    summaries = {}
+    for mode in args.modes:
+        try:
+            summaries[mode] = bench_server(MODES[mode], args, title=mode)
+        except RuntimeError as e:
+            print(f"\n=== {mode} === ignoré : {e}")
+
+    print(f"\n{'mode':<20}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'err':>6}")
+    for mode, s in summaries.items():
+        print(f"{mode:<20}{s['throughput']:>10.1f}{s['p50']:>10.1f}{s['p95']:>10.1f}{s['p99']:>10.1f}{s['errors']:>6}")
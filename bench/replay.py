@@ -0,0 +1,146 @@
+# ==============================================================================
+# FICHIER : bench/replay.py
+#
+# DESCRIPTION :
+# Rejoue une capture réelle (CAPTURE_SAMPLE_RATE > 0, data/requests.jsonl et
+# ses rotations) à travers le handler Alexa, hors ligne : les stubs TMDB / Trakt
+# répondent avec les réponses upstream enregistrées (repli synthétique sinon),
+# Kodi et adb sont simulés. Les sessions sont rejouées dans l'ordre, en parallèle
+# entre elles ; chaque réponse est comparée à celle capturée (texte + fin de
+# session) pour servir de test de non-régression, et les latences sont
+# rapportées par intent comme dans run_bench.py.
+#
+# USAGE : python bench/replay.py data/requests.jsonl --concurrency 4 --latency 50
+# ==============================================================================
+
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import stubs  # noqa: E402
+from run_bench import report  # noqa: E402
+
+def capture_files(path):
+    """requests.jsonl.5 ... requests.jsonl.1 puis requests.jsonl : du plus ancien au plus récent."""
+    rotated = [p for p in glob.glob(f"{glob.escape(path)}.*") if p.rsplit(".", 1)[1].isdigit()]
+    rotated.sort(key=lambda p: int(p.rsplit(".", 1)[1]), reverse=True)
+    return rotated + ([path] if os.path.exists(path) else [])
+
+def load_capture(path):
+    entries = []
+    for file_path in capture_files(path):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line: continue
+                try: entries.append(json.loads(line))
+                except ValueError: print(f"Ligne ignorée (JSON invalide) dans {file_path}")
+    entries.sort(key=lambda e: e.get("ts", 0))
+    return entries
+
+def build_recordings(entries):
+    """Réponses GET TMDB / Trakt capturées, indexées comme les reçoivent les stubs."""
+    recordings = defaultdict(dict)
+    for entry in entries:
+        for call in entry.get("upstream", []):
+            if call.get("method") != "GET" or call.get("upstream") not in ("tmdb", "trakt"): continue
+            recordings[call["upstream"]][stubs.recording_key(call["path"], call.get("query") or {})] = (call["status"], call["body"])
+    return recordings
+
+def group_sessions(entries):
+    sessions = defaultdict(list)
+    for entry in entries: sessions[entry.get("session_id")].append(entry)
+    return list(sessions.values())
+
+def request_name(envelope):
+    request = envelope.get("request", {})
+    return request.get("intent", {}).get("name") or request.get("type", "?")
+
+def speech(response):
+    if not isinstance(response, dict): return None, None
+    body = response.get("response", {})
+    return body.get("outputSpeech", {}).get("text"), body.get("shouldEndSession")
+
+def replay_session(client, session):
+    """Rejoue une session dans l'ordre. Le jeton de session renvoyé par le serveur change à chaque
+    exécution : celui de la capture est remplacé par le nouveau dans les requêtes suivantes."""
+    results, diffs = [], []
+    tokens = {}
+    for entry in session:
+        envelope = json.loads(json.dumps(entry["request"]))
+        attributes = envelope.get("session", {}).get("attributes") or {}
+        if attributes.get("session_token") in tokens: attributes["session_token"] = tokens[attributes["session_token"]]
+
+        t0 = time.perf_counter()
+        r = client.post("/alexa-webhook", json=envelope)
+        ms = (time.perf_counter() - t0) * 1000
+        replayed = r.get_json(silent=True)
+        name = request_name(envelope)
+        results.append((name, ms, r.status_code == 200))
+
+        captured = entry.get("response")
+        old_token = ((captured or {}).get("sessionAttributes") or {}).get("session_token")
+        new_token = ((replayed or {}).get("sessionAttributes") or {}).get("session_token")
+        if old_token and new_token: tokens[old_token] = new_token
+        if speech(captured) != speech(replayed):
+            diffs.append({"request_id": entry.get("request_id"), "intent": name,
+                          "captured": speech(captured), "replayed": speech(replayed)})
+    return results, diffs
+
+def main():
+    parser = argparse.ArgumentParser(description="Rejoue une capture de trafic Alexa contre des stubs locaux")
+    parser.add_argument("capture", nargs="?", default=os.path.join(ROOT_DIR, "data", "requests.jsonl"))
+    parser.add_argument("--concurrency", type=int, default=4, help="sessions rejouées simultanément")
+    parser.add_argument("--latency", type=float, default=0.0, help="latence ajoutée par les stubs (ms)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="gigue des stubs (ms)")
+    parser.add_argument("--repeat", type=int, default=1, help="nombre de passes (la 1re réchauffe caches et index)")
+    parser.add_argument("--show-diffs", type=int, default=10, help="nombre de divergences affichées")
+    args = parser.parse_args()
+
+    entries = load_capture(args.capture)
+    if not entries:
+        print(f"Aucune capture trouvée : {args.capture}")
+        return 1
+    sessions = group_sessions(entries)
+    recordings = build_recordings(entries)
+    print(f"{len(entries)} requêtes, {len(sessions)} sessions, "
+          f"{sum(len(v) for v in recordings.values())} réponses upstream enregistrées.")
+
+    stub_set = stubs.start_stubs(args.latency, args.jitter, recordings=recordings)
+    workdir = tempfile.mkdtemp(prefix="kodi-replay-")
+    os.environ.update(stubs.app_env(stub_set))
+    os.environ.update({
+        "PATH": os.path.join(BENCH_DIR, "fake_adb") + os.pathsep + os.environ.get("PATH", ""),
+        "CACHE_DB_PATH": os.path.join(workdir, "cache.db"),
+        "CAPTURE_SAMPLE_RATE": "0", "SPECULATIVE_WAKE": "false",
+    })
+    sys.path.insert(0, ROOT_DIR)
+    import app  # noqa: E402 (configuré par l'environnement ci-dessus)
+
+    for run in range(args.repeat):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            outcomes = list(pool.map(lambda s: replay_session(app.app.test_client(), s), sessions))
+        elapsed = time.perf_counter() - started
+        results = [r for session_results, _ in outcomes for r in session_results]
+        diffs = [d for _, session_diffs in outcomes for d in session_diffs]
+        report(results, elapsed, f"Passe {run + 1}/{args.repeat}")
+        print(f"Réponses divergentes : {len(diffs)}/{len(results)}")
+        for diff in diffs[:args.show_diffs]:
+            print(f"  {diff['intent']} ({diff['request_id']}) : capturé={diff['captured']} rejoué={diff['replayed']}")
+    replayed = {name: config.replayed for name, config in stub_set["configs"].items()}
+    print(f"Réponses upstream rejouées depuis la capture : {replayed}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,185 @@
+# ==============================================================================
+# FICHIER : bench/run_bench.py
+#
+# DESCRIPTION :
+# Benchmark de charge reproductible de /alexa-webhook, sans Shield ni clés API :
+# démarre les stubs TMDB / Trakt / Kodi (bench/stubs.py), place le faux adb
+# (bench/fake_adb) dans le PATH, lance app.py puis rejoue les enveloppes Alexa
+# enregistrées (bench/envelopes.json) à la concurrence demandée. Les entrées
+# "turns" sont des dialogues en plusieurs tours : chaque tour renvoie au serveur
+# les sessionAttributes (session_token) reçus au tour précédent, comme Alexa.
+# Rapporte p50 / p95 / p99 par intent et le débit global.
+#
+# USAGE : python bench/run_bench.py --concurrency 8 --requests 400 --latency 150
+# ==============================================================================
+
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)] if values else 0.0
+
+def load_envelopes(path, names=None):
+    with open(path, 'r', encoding='utf-8') as f: envelopes = json.load(f)
+    by_name = {e["name"]: e for e in envelopes if "envelope" in e}
+    for e in envelopes:
+        if "turns" in e: e["turns"] = [by_name[turn] for turn in e["turns"]]
+    if names: envelopes = [e for e in envelopes if e["name"] in names]
+    return envelopes
+
+def start_server(command, env, port, log_path, timeout=30):
+    log = open(log_path, 'w')
+    proc = subprocess.Popen(command, cwd=ROOT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None: raise RuntimeError(f"Le serveur s'est arrêté (voir {log_path})")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/stats", timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"Le serveur ne répond pas (voir {log_path})")
+
+def start_stub_process(args):
+    """Stubs dans un process séparé : ils ne partagent pas le GIL avec le générateur de charge."""
+    proc = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "stubs.py"), "--json",
+                             "--latency", str(args.latency), "--jitter", str(args.jitter),
+                             "--error-rate", str(args.error_rate)], stdout=subprocess.PIPE, text=True)
+    return proc, json.loads(proc.stdout.readline())
+
+def build_env(stubs, port, args, workdir):
+    env = dict(os.environ)
+    env.update(stubs["env"])
+    env.update({
+        "PORT": str(port),
+        "PATH": os.path.join(BENCH_DIR, "fake_adb") + os.pathsep + env.get("PATH", ""),
+        "FAKE_ADB_LATENCY": str(args.adb_latency / 1000),
+        "CACHE_DB_PATH": os.path.join(workdir, "cache.db"),
+        "PYTHONUNBUFFERED": "1",
+    })
+    if args.cold:
+        # Chemin froid : ni cache ni index de titres, chaque requête remonte à l'upstream
+        env.update({"CACHE_TTL_SEARCH": "0", "CACHE_TTL_MANIFEST": "0",
+                    "TITLE_INDEX_MIN_SCORE": "2", "TRAKT_INDEX_MAX_AGE": "0"})
+    return env
+
+def post_turn(http, url, item, session_id, attributes):
+    """Un tour de dialogue. Renvoie (résultat, sessionAttributes de la réponse)."""
+    envelope = json.loads(json.dumps(item["envelope"]))
+    envelope["request"]["requestId"] = f"amzn1.echo-api.request.{uuid.uuid4()}"
+    if session_id:
+        envelope["session"].update({"sessionId": session_id, "new": attributes is None,
+                                    "attributes": attributes or {}})
+    t0 = time.perf_counter()
+    try:
+        r = http.post(url, json=envelope, timeout=10)
+        ok = r.status_code == 200
+        returned = (r.json().get("sessionAttributes") or {}) if ok else {}
+    except (requests.RequestException, ValueError):
+        ok, returned = False, {}
+    return (item["name"], (time.perf_counter() - t0) * 1000, ok), returned
+
+def run_load(url, envelopes, concurrency, total):
+    """Envoie `total` entrées (enveloppes en boucle) avec `concurrency` clients. Une entrée "turns" joue
+    tout son dialogue sous un sessionId propre et compte un résultat par tour. Renvoie (résultats, durée)."""
+    local = threading.local()
+    cycle = itertools.cycle(envelopes)
+    cycle_lock = threading.Lock()
+
+    def one(_):
+        if not hasattr(local, "session"): local.session = requests.Session()
+        with cycle_lock: item = next(cycle)
+        if "turns" not in item: return [post_turn(local.session, url, item, None, None)[0]]
+        session_id, attributes, results = f"amzn1.echo-api.session.{uuid.uuid4()}", None, []
+        for turn in item["turns"]:
+            (name, ms, ok), attributes = post_turn(local.session, url, turn, session_id, attributes)
+            # Tour suivant sans jeton : le dialogue serait servi par _from_attributes ou pas du tout
+            if not attributes.get("session_token") and turn is not item["turns"][-1]: ok = False
+            results.append((f"{item['name']}/{name}", ms, ok))
+        return results
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = [r for batch in pool.map(one, range(total)) for r in batch]
+    return results, time.perf_counter() - started
+
+def report(results, elapsed, title=None):
+    by_name = defaultdict(list)
+    errors = defaultdict(int)
+    for name, ms, ok in results:
+        by_name[name].append(ms)
+        if not ok: errors[name] += 1
+
+    if title: print(f"\n=== {title} ===")
+    print(f"{'intent':<34}{'n':>6}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name in sorted(by_name):
+        values = by_name[name]
+        print(f"{name:<34}{len(values):>6}{errors[name]:>6}{percentile(values, 50):>10.1f}"
+              f"{percentile(values, 95):>10.1f}{percentile(values, 99):>10.1f}")
+    everything = [ms for _, ms, _ in results]
+    print(f"{'TOTAL':<34}{len(everything):>6}{sum(errors.values()):>6}{percentile(everything, 50):>10.1f}"
+          f"{percentile(everything, 95):>10.1f}{percentile(everything, 99):>10.1f}")
+    print(f"Débit : {len(results) / elapsed:.1f} req/s sur {elapsed:.2f}s")
+    return {"p50": percentile(everything, 50), "p95": percentile(everything, 95), "p99": percentile(everything, 99),
+            "throughput": len(results) / elapsed, "errors": sum(errors.values())}
+
+def add_common_args(parser):
+    parser.add_argument("--concurrency", type=int, default=8, help="clients simultanés")
+    parser.add_argument("--requests", type=int, default=400, help="nombre total de requêtes")
+    parser.add_argument("--latency", type=float, default=100.0, help="latence des stubs (ms)")
+    parser.add_argument("--jitter", type=float, default=20.0, help="gigue des stubs (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="taux d'erreurs 500 injectées (0-1)")
+    parser.add_argument("--adb-latency", type=float, default=20.0, help="latence du faux adb (ms)")
+    parser.add_argument("--cold", action="store_true", help="désactive cache et index (chemin froid)")
+    parser.add_argument("--intents", nargs="*", help="limiter aux enveloppes nommées")
+    parser.add_argument("--envelopes", default=os.path.join(BENCH_DIR, "envelopes.json"))
+    parser.add_argument("--port", type=int, default=5077)
+
+def bench_server(command, args, title=None):
+    stub_proc, stubs = start_stub_process(args)
+    workdir = tempfile.mkdtemp(prefix="kodi-bench-")
+    log_path = os.path.join(workdir, "server.log")
+    try:
+        proc = start_server(command, build_env(stubs, args.port, args, workdir), args.port, log_path)
+    except Exception:
+        stub_proc.kill()
+        raise
+    try:
+        envelopes = load_envelopes(args.envelopes, args.intents)
+        url = f"http://127.0.0.1:{args.port}/alexa-webhook"
+        run_load(url, envelopes, 1, len(envelopes))  # échauffement
+        results, elapsed = run_load(url, envelopes, args.concurrency, args.requests)
+        summary = report(results, elapsed, title)
+        upstream = {name: requests.get(url, timeout=2).json()["requests"] for name, url in stubs["stats_urls"].items()}
+        print(f"Appels upstream : {upstream}  (log serveur : {log_path})")
+        sessions = requests.get(f"http://127.0.0.1:{args.port}/stats", timeout=2).json()["sessions"]
+        print(f"Dialogues par jeton : {sessions['hits']} repris, {sessions['misses']} perdus")
+        return summary
+    finally:
+        for p in [proc, stub_proc]:
+            p.terminate()
+            try: p.wait(timeout=10)
+            except subprocess.TimeoutExpired: p.kill()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de charge de /alexa-webhook avec stubs locaux")
+    add_common_args(parser)
+    args = parser.parse_args()
+    bench_server([sys.executable, "app.py"], args)
@@ -0,0 +1,228 @@
+# ==============================================================================
+# FICHIER : bench/stubs.py
+#
+# DESCRIPTION :
+# Serveurs locaux imitant TMDB (search/tv/season), Trakt (search/progress/sync)
+# et Kodi (JSON-RPC HTTP + TCP avec notifications de lecture), avec latence et
+# taux d'erreur configurables. Utilisés par le benchmark et l'outil de replay.
+#
+# USAGE : python bench/stubs.py --latency 150 --jitter 50 --error-rate 0.02
+# ==============================================================================
+
+import argparse
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+class StubHTTPServer(ThreadingHTTPServer):
+    # File d'attente large : sous forte concurrence, le défaut (5) provoque des resets
+    request_queue_size = 512
+    daemon_threads = True
+
+class StubConfig:
+    """Latence (ms), gigue (ms) et taux d'erreur (0-1) appliqués à chaque réponse."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self.replayed = 0
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock: self.requests += 1
+        ms = max(self.latency + random.uniform(-self.jitter, self.jitter), 0)
+        if ms: time.sleep(ms / 1000)
+        return random.random() < self.error_rate
+
+def _stable_id(text, base=1000):
+    return base + int(hashlib.md5(text.lower().encode('utf-8')).hexdigest()[:6], 16)
+
+def _tmdb_season(season):
+    # Saison 3 en cours de diffusion : épisodes 9 et 10 annoncés mais pas encore sortis
+    return {"season_number": season, "episodes": [
+        {"episode_number": e, "season_number": season,
+         "air_date": "2099-01-01" if season == 3 and e > 8 else f"2026-0{min(season, 9)}-{e:02d}"} for e in range(1, 11)]}
+
+def _tmdb_routes(path, query):
+    """Réponses TMDB déterministes dérivées du texte recherché."""
+    parts = path.strip("/").split("/")
+    if parts[:2] == ["3", "search"]:
+        text = query.get("query", [""])[0]
+        if text.lower().startswith("zzz"): return 200, {"results": []}
+        if parts[2] == "movie":
+            year = query.get("year", ["2010"])[0]
+            return 200, {"results": [{"id": _stable_id(text), "title": text.title(), "release_date": f"{year}-01-01"}]}
+        return 200, {"results": [{"id": _stable_id(text, 500000), "name": text.title()}]}
+    if parts[:2] == ["3", "tv"] and len(parts) == 3:
+        show = {"id": int(parts[2]), "number_of_seasons": 3, "status": "Returning Series",
+                "seasons": [{"season_number": n, "episode_count": 10} for n in range(1, 4)],
+                "last_episode_to_air": {"season_number": 3, "episode_number": 8, "air_date": "2026-03-08"},
+                "next_episode_to_air": {"season_number": 3, "episode_number": 9, "air_date": "2099-01-01"}}
+        for item in query.get("append_to_response", [""])[0].split(","):
+            if item.startswith("season/"): show[item] = _tmdb_season(int(item.split("/")[1]))
+        return 200, show
+    if parts[:2] == ["3", "tv"] and len(parts) == 5 and parts[3] == "season":
+        return 200, _tmdb_season(int(parts[4]))
+    if parts[:2] == ["3", "tv"] and len(parts) == 7:
+        return (200, {"id": 1}) if int(parts[6]) <= 10 and int(parts[4]) <= 3 else (404, {"status_code": 34})
+    return 404, {"status_code": 34}
+
+def _trakt_routes(path, query):
+    parts = path.strip("/").split("/")
+    if parts[:2] == ["search", "tmdb"]:
+        return 200, [{"type": "show", "show": {"ids": {"trakt": int(parts[2]) + 7, "tmdb": int(parts[2])}}}]
+    if parts[0] == "shows" and parts[2:] == ["progress", "watched"]:
+        return 200, {"next_episode": {"season": 2, "number": 4}}
+    if parts == ["sync", "last_activities"]:
+        return 200, {"episodes": {"watched_at": "2026-10-01T20:00:00.000Z"}}
+    if parts == ["sync", "watched", "shows"]:
+        return 200, [{"last_watched_at": "2026-10-01T20:00:00.000Z", "show": {"ids": {"trakt": 507, "tmdb": 500}},
+                      "seasons": [{"number": 1, "episodes": [{"number": e, "plays": 1} for e in range(1, 11)]},
+                                  {"number": 2, "episodes": [{"number": e, "plays": 1} for e in range(1, 4)]}]}]
+    return 404, {}
+
+def _kodi_rpc(payload):
+    method = payload.get("method")
+    if method == "VideoLibrary.GetMovies":
+        result = {"movies": [{"title": "Inception", "year": 2010, "uniqueid": {"tmdb": "27205"}}]}
+    elif method == "VideoLibrary.GetTVShows":
+        result = {"tvshows": [{"title": "The Office", "year": 2005, "uniqueid": {"tmdb": "2316"}}]}
+    elif method == "Player.GetActivePlayers":
+        result = []
+    else:
+        result = "OK"
+    return {"jsonrpc": "2.0", "id": payload.get("id"), "result": result}
+
+def recording_key(path, query):
+    """Clé de correspondance d'une réponse enregistrée (bench/replay.py) : chemin + paramètres, sans clé d'API."""
+    return path, tuple(sorted((k, tuple(v)) for k, v in query.items() if k != "api_key"))
+
+def _make_handler(config, routes=None, rpc=False, recorded=None):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/__stats": return self._reply(200, {"requests": config.requests, "replayed": config.replayed})
+            if config.delay(): return self._reply(500, {"error": "injected"})
+            if rpc: return self._reply(405, {})
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            # Réponse réelle capturée si disponible, sinon réponse synthétique
+            hit = (recorded or {}).get(recording_key(url.path, query))
+            if hit: config.replayed += 1
+            self._reply(*(hit or routes(url.path, query)))
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if config.delay(): return self._reply(500, {"error": "injected"})
+            self._reply(200, _kodi_rpc(payload))
+
+        def log_message(self, *args): pass
+    return Handler
+
+class KodiTcpStub:
+    """JSON-RPC TCP de Kodi : répond aux requêtes et émet Player.OnPlay/OnAVStart après Player.Open."""
+
+    def __init__(self, config, play_delay=0.2):
+        self.config = config
+        self.play_delay = play_delay
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen()
+        self.port = self.sock.getsockname()[1]
+
+    def serve_forever(self):
+        while True:
+            conn, _ = self.sock.accept()
+            threading.Thread(target=self._client, args=(conn,), daemon=True).start()
+
+    def _client(self, conn):
+        decoder, buffer = json.JSONDecoder(), ""
+        try:
+            while True:
+                chunk = conn.recv(65536)
+                if not chunk: return
+                buffer += chunk.decode('utf-8')
+                while buffer.strip():
+                    buffer = buffer.lstrip()
+                    try: payload, end = decoder.raw_decode(buffer)
+                    except ValueError: break
+                    buffer = buffer[end:]
+                    self.config.delay()
+                    conn.sendall(json.dumps(_kodi_rpc(payload)).encode('utf-8'))
+                    if payload.get("method") == "Player.Open":
+                        threading.Thread(target=self._notify, args=(conn,), daemon=True).start()
+        except OSError: pass
+
+    def _notify(self, conn):
+        try:
+            for method in ["Player.OnPlay", "Player.OnAVStart"]:
+                time.sleep(self.play_delay)
+                conn.sendall(json.dumps({"jsonrpc": "2.0", "method": method, "params": {"data": {}}}).encode('utf-8'))
+        except OSError: pass
+
+def _serve(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def start_stubs(latency=0.0, jitter=0.0, error_rate=0.0, recordings=None):
+    """Démarre tous les stubs sur des ports libres. Renvoie un dict de configuration (URLs, ports, compteurs).
+    recordings : {"tmdb"|"trakt": {recording_key: (status, body)}} rejoués en priorité."""
+    configs = {name: StubConfig(latency, jitter, error_rate) for name in ["tmdb", "trakt", "kodi"]}
+    recordings = recordings or {}
+    tmdb = _serve(StubHTTPServer(("127.0.0.1", 0), _make_handler(configs["tmdb"], _tmdb_routes, recorded=recordings.get("tmdb"))))
+    trakt = _serve(StubHTTPServer(("127.0.0.1", 0), _make_handler(configs["trakt"], _trakt_routes, recorded=recordings.get("trakt"))))
+    kodi = _serve(StubHTTPServer(("127.0.0.1", 0), _make_handler(configs["kodi"], rpc=True)))
+    kodi_tcp = _serve(KodiTcpStub(configs["kodi"]))
+    return {
+        "configs": configs,
+        "stats_urls": {name: f"http://127.0.0.1:{server.server_address[1]}/__stats"
+                       for name, server in [("tmdb", tmdb), ("trakt", trakt), ("kodi", kodi)]},
+        "tmdb_url": f"http://127.0.0.1:{tmdb.server_address[1]}/3",
+        "trakt_url": f"http://127.0.0.1:{trakt.server_address[1]}",
+        "kodi_port": kodi.server_address[1],
+        "kodi_tcp_port": kodi_tcp.port,
+    }
+
+def app_env(stubs):
+    """Variables d'environnement pointant app.py vers les stubs."""
+    return {
+        "SHIELD_IP": "127.0.0.1", "SHIELD_MAC": "AA:BB:CC:DD:EE:FF",
+        "KODI_PORT": str(stubs["kodi_port"]), "KODI_TCP_PORT": str(stubs["kodi_tcp_port"]),
+        "TMDB_API_KEY": "bench", "TMDB_API_URL": stubs["tmdb_url"],
+        "TRAKT_CLIENT_ID": "bench", "TRAKT_ACCESS_TOKEN": "bench", "TRAKT_API_URL": stubs["trakt_url"],
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stubs locaux TMDB / Trakt / Kodi")
+    parser.add_argument("--latency", type=float, default=0.0, help="latence ajoutée par réponse (ms)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="gigue +/- (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="proportion de réponses 500 (0-1)")
+    parser.add_argument("--json", action="store_true", help="une ligne JSON {env, stats_urls} (usage par run_bench.py)")
+    args = parser.parse_args()
+
+    stubs = start_stubs(args.latency, args.jitter, args.error_rate)
+    if args.json:
+        print(json.dumps({"env": app_env(stubs), "stats_urls": stubs["stats_urls"]}), flush=True)
+    else:
+        for key, value in app_env(stubs).items(): print(f"{key}={value}")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt: pass
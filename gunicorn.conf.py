@@ -0,0 +1,54 @@
+# ==============================================================================
+# FICHIER : gunicorn.conf.py
+#
+# DESCRIPTION :
+# Mode de service production (remplace le serveur de dev Flask).
+# Un seul process : caches, index, file de lecture et session ADB vivent en
+# mémoire et ne doivent pas être dupliqués. La concurrence vient des workers
+# gevent : les attentes TMDB / Trakt / Kodi / adb cèdent la main au lieu de
+# bloquer un thread OS.
+#
+# Choix de gevent (bench/compare_servers.py --requests 1500 --latency 200
+# --cold, manifestes de saison compris, 1 cœur partagé avec les stubs et le
+# générateur de charge) :
+#   - à 8 et 16 clients, les trois modes se valent (34 et 66 req/s, p99
+#     772 / 788 ms en gevent contre 765 / 905 ms pour le serveur de dev) ;
+#   - à 32 et 64 clients, le serveur de dev plafonne à 73 req/s (p99 2,0 s
+#     puis 4,6 s) : ses appels upstream passent par les 8 threads de
+#     UPSTREAM_WORKERS. gevent monte à 136 puis 204 req/s (p99 806 ms puis
+#     1,05 s) sans réglage. Avec UPSTREAM_WORKERS=32, le serveur de dev
+#     rattrape gevent à 64 clients (205 req/s, p99 959 ms) ;
+#   - gthread plafonne à 67 req/s dès 32 clients (16 threads, p50 772 ms à 64).
+# gevent tient la charge sans dimensionner de pool de threads, et apporte en
+# plus les délais et l'arrêt propre de gunicorn. Les greenlets ne sont pas
+# préemptés : à saturation, les intents à plusieurs appels upstream
+# (resume_show, play_show_ask) attendent le CPU derrière les autres.
+#
+# USAGE : gunicorn -c gunicorn.conf.py app:app
+# ==============================================================================
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = 1
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+
+# gevent : nombre de requêtes simultanées par process
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "200"))
+# gthread (repli sans gevent) : threads OS par process
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+
+# Pools HTTP upstream dimensionnés pour la concurrence du worker (sinon connexions jetées puis recréées)
+os.environ.setdefault("HTTP_POOL_SIZE", "50")
+os.environ.setdefault("UPSTREAM_WORKERS", "32")
+
+# Alexa coupe à ~8s : au-delà, inutile de garder la requête
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = 10
+keepalive = 5
+loglevel = "info"
+
+def post_worker_init(worker):
+    # Le worker est monkey-patché (gevent) à ce stade : les threads de fond deviennent des greenlets
+    from app import init_app
+    init_app()
@@ -0,0 +1,242 @@
+# ==============================================================================
+# FICHIER : tests/test_kodi_rpc.py
+#
+# DESCRIPTION :
+# Tests du client JSON-RPC TCP de Kodi (KodiRpcClient) contre un serveur
+# JSON-RPC local : association des réponses pipelinées par id, trames JSON
+# concaténées ou coupées, confirmation Player.OnAVStart, lecture non confirmée
+# (délai, demande remplacée), repli HTTP quand le port TCP est fermé et
+# nouveau réveil quand un état READY périmé a fait sauter le réveil.
+#
+# USAGE : python -m pytest -q tests
+# ==============================================================================
+
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("CACHE_DB_PATH", os.path.join(tempfile.mkdtemp(), "cache.db"))
+
+import app  # noqa: E402
+
+class StubKodiTcp:
+    """Serveur JSON-RPC TCP minimal : une connexion, requêtes décodées dans self.requests.
+    on_request(stub, request) décide de ce qui est renvoyé (via stub.send)."""
+
+    def __init__(self, on_request=None):
+        self.on_request = on_request or (lambda stub, request: stub.reply(request, "OK"))
+        self.requests = []
+        self.received = threading.Condition()
+        self.conn = None
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen()
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        try: self.conn, _ = self.sock.accept()
+        except OSError: return
+        decoder, buffer = json.JSONDecoder(), ""
+        try:
+            while True:
+                chunk = self.conn.recv(65536)
+                if not chunk: return
+                buffer += chunk.decode('utf-8')
+                while buffer.strip():
+                    buffer = buffer.lstrip()
+                    try: request, end = decoder.raw_decode(buffer)
+                    except ValueError: break
+                    buffer = buffer[end:]
+                    with self.received:
+                        self.requests.append(request)
+                        self.received.notify_all()
+                    self.on_request(self, request)
+        except OSError: pass
+
+    def wait_requests(self, count, timeout=2):
+        with self.received:
+            return self.received.wait_for(lambda: len(self.requests) >= count, timeout)
+
+    def send(self, *messages):
+        self.conn.sendall("".join(json.dumps(m) for m in messages).encode('utf-8'))
+
+    @staticmethod
+    def result(request, result):
+        return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+    def reply(self, request, result):
+        self.send(self.result(request, result))
+
+    def notify(self, method):
+        self.send({"jsonrpc": "2.0", "method": method, "params": {"data": {}}})
+
+    def close(self):
+        for s in [self.conn, self.sock]:
+            if s:
+                try: s.close()
+                except OSError: pass
+
+def closed_port():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+class KodiRpcClientTest(unittest.TestCase):
+
+    def start(self, on_request=None):
+        stub = StubKodiTcp(on_request)
+        self.addCleanup(stub.close)
+        return stub, app.KodiRpcClient("127.0.0.1", stub.port)
+
+    def test_pipelined_replies_matched_by_id(self):
+        # Aucune réponse immédiate : le stub répond aux deux requêtes d'un bloc, dans l'ordre inverse
+        stub, client = self.start(on_request=lambda stub, request: None)
+        first = client.send("JSONRPC.Ping")
+        second = client.send("Player.GetActivePlayers")
+        self.assertTrue(stub.wait_requests(2))
+        ping, players = stub.requests
+        stub.send(stub.result(players, [{"playerid": 1}]), stub.result(ping, "pong"))
+
+        self.assertEqual(first.result(timeout=2)["result"], "pong")
+        self.assertEqual(second.result(timeout=2)["result"], [{"playerid": 1}])
+
+    def test_frames_split_across_reads(self):
+        stub, client = self.start(on_request=lambda stub, request: None)
+        future = client.send("JSONRPC.Ping")
+        self.assertTrue(stub.wait_requests(1))
+        data = json.dumps(stub.result(stub.requests[0], "pong")).encode('utf-8')
+        # Notification et réponse dans le même paquet, réponse coupée en deux envois
+        stub.conn.sendall(json.dumps({"jsonrpc": "2.0", "method": "Other.Event", "params": {}}).encode('utf-8') + data[:10])
+        time.sleep(0.05)
+        stub.conn.sendall(data[10:])
+        self.assertEqual(future.result(timeout=2)["result"], "pong")
+
+    def test_call_raises_when_connection_drops(self):
+        stub, client = self.start(on_request=lambda stub, request: stub.conn.close())
+        with self.assertRaises(ConnectionError):
+            client.call("JSONRPC.Ping", timeout=2)
+
+    def test_open_not_resent_when_connection_drops(self):
+        # Player.Open parti puis connexion fermée par Kodi : envoyé mais non confirmé, jamais renvoyé
+        stub, client = self.start(on_request=lambda stub, request: stub.conn.close())
+        self.assertIs(client.open_and_confirm("plugin://test", time.monotonic()), False)
+        self.assertEqual(client.stats()["unconfirmed"], 1)
+
+    def test_worker_no_http_retry_after_tcp_open_sent(self):
+        stub, _ = self.start(on_request=lambda stub, request: stub.conn.close())
+        device = app.Device("dropped", "127.0.0.1", "AA:BB:CC:DD:EE:FF", closed_port(), kodi_tcp_port=stub.port)
+        with mock.patch.object(app, "wake_and_start_kodi", return_value=True), \
+             mock.patch.object(device.kodi_client, "post") as http_post:
+            app.worker_process(device, "plugin://test")
+        self.assertEqual([r["method"] for r in stub.requests], ["Player.Open"])
+        http_post.assert_not_called()
+
+    def test_open_confirmed_on_av_start(self):
+        def on_request(stub, request):
+            stub.reply(request, "OK")
+            if request["method"] == "Player.Open":
+                stub.notify("Player.OnPlay")
+                stub.notify("Player.OnAVStart")
+        stub, client = self.start(on_request)
+
+        self.assertIs(client.open_and_confirm("plugin://test", time.monotonic()), True)
+        self.assertEqual(stub.requests[0]["params"], {"item": {"file": "plugin://test"}})
+        self.assertEqual(client.stats()["confirmed"], 1)
+        self.assertIsNotNone(client.stats()["last_play_latency_s"])
+
+    def test_open_unconfirmed_after_timeout(self):
+        def on_request(stub, request):
+            stub.reply(request, "OK")
+            stub.notify("Player.OnPlay")  # flux ouvert, mais jamais de première image
+        stub, client = self.start(on_request)
+
+        with mock.patch.object(app, "KODI_PLAY_CONFIRM_TIMEOUT", 0.2):
+            self.assertIs(client.open_and_confirm("plugin://test", time.monotonic()), False)
+        self.assertEqual(client.stats()["unconfirmed"], 1)
+        self.assertEqual(client.stats()["confirmed"], 0)
+
+    def test_open_unconfirmed_when_superseded(self):
+        stub, client = self.start()
+        started = time.monotonic()
+        self.assertIs(client.open_and_confirm("plugin://test", started, still_wanted=lambda: False), False)
+        # Abandon dès la première vérification, bien avant KODI_PLAY_CONFIRM_TIMEOUT
+        self.assertLess(time.monotonic() - started, app.KODI_PLAY_CONFIRM_TIMEOUT)
+        self.assertEqual(client.stats()["unconfirmed"], 1)
+
+    def test_open_rejected_by_kodi(self):
+        stub, client = self.start(on_request=lambda stub, request: stub.send(
+            {"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32602, "message": "Invalid params."}}))
+        self.assertIs(client.open_and_confirm("plugin://test", time.monotonic()), False)
+
+    def test_open_returns_none_when_port_closed(self):
+        client = app.KodiRpcClient("127.0.0.1", closed_port())
+        self.assertIsNone(client.open_and_confirm("plugin://test", time.monotonic()))
+        self.assertFalse(client.stats()["connected"])
+
+class HttpFallbackTest(unittest.TestCase):
+
+    def test_worker_falls_back_to_http_when_tcp_closed(self):
+        received = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+                data = json.dumps({"jsonrpc": "2.0", "id": 1, "result": "OK"}).encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args): pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        device = app.Device("test", "127.0.0.1", "AA:BB:CC:DD:EE:FF", server.server_address[1],
+                            kodi_tcp_port=closed_port())
+        with mock.patch.object(app, "wake_and_start_kodi", return_value=True):
+            app.worker_process(device, "plugin://test")
+
+        self.assertEqual(len(received), 1)
+        self.assertEqual(received[0]["method"], "Player.Open")
+        self.assertEqual(received[0]["params"], {"item": {"file": "plugin://test"}})
+
+class StalePresenceTest(unittest.TestCase):
+
+    def test_worker_wakes_again_when_kodi_unreachable(self):
+        # Présence READY récente mais Shield éteinte depuis : Player.Open ne joint personne
+        device = app.Device("stale", "127.0.0.1", "AA:BB:CC:DD:EE:FF", closed_port(), kodi_tcp_port=closed_port())
+        with mock.patch.object(app, "wake_and_start_kodi", return_value=True) as wake, \
+             mock.patch.object(app, "player_open", side_effect=[False, True]) as player_open, \
+             mock.patch.object(app, "is_kodi_responsive", return_value=False), \
+             mock.patch.object(device.presence, "invalidate") as invalidate:
+            app.worker_process(device, "plugin://test")
+        self.assertEqual(wake.call_count, 2)
+        self.assertEqual(player_open.call_count, 2)
+        invalidate.assert_called_once()
+
+    def test_worker_does_not_resend_when_kodi_answers(self):
+        device = app.Device("flaky", "127.0.0.1", "AA:BB:CC:DD:EE:FF", closed_port(), kodi_tcp_port=closed_port())
+        with mock.patch.object(app, "wake_and_start_kodi", return_value=True), \
+             mock.patch.object(app, "player_open", return_value=False) as player_open, \
+             mock.patch.object(app, "is_kodi_responsive", return_value=True):
+            app.worker_process(device, "plugin://test")
+        player_open.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()